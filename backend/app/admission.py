@@ -0,0 +1,130 @@
+from enum import IntEnum
+from typing import Optional
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the queue wait histogram buckets
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+class Priority(IntEnum):
+    """Admission priority; lower values are admitted first"""
+    ADMIN = 0
+    INTERACTIVE = 1
+    BACKGROUND = 2
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being queued any longer"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Global cap on concurrent upstream calls, with a priority queue in front of it.
+
+    Callers over the cap wait in priority order (FIFO within a priority) for at most
+    max_queue_wait seconds; past that, or when the queue is full, they are shed.
+    """
+
+    def __init__(self, concurrency: int, max_queue_wait: float, max_queue_length: int):
+        self.concurrency = concurrency
+        self.max_queue_wait = max_queue_wait
+        self.max_queue_length = max_queue_length
+        
+        self._active = 0
+        # Heap of (priority, arrival order, future); abandoned entries stay until popped
+        self._queue = []
+        self._order = itertools.count()
+        self._queued = {priority: 0 for priority in Priority}
+        
+        self.admitted = 0
+        self.shed = 0
+        self._wait_histogram = {priority: [0] * len(WAIT_BUCKETS) for priority in Priority}
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE, timeout: Optional[float] = None):
+        """Wait for a slot, for at most max_queue_wait (or timeout, if shorter) seconds.
+
+        Every successful acquire must be paired with release().
+        """
+        if self._active < self.concurrency and self.queue_length == 0:
+            self._active += 1
+            self._admit(priority, 0.0)
+            return
+        
+        if self.queue_length >= self.max_queue_length:
+            self.shed += 1
+            raise AdmissionRejected("Admission queue is full", retry_after=math.ceil(self.max_queue_wait))
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._order), future))
+        self._queued[priority] += 1
+        queued_at = time.monotonic()
+        
+        max_wait = self.max_queue_wait if timeout is None else min(timeout, self.max_queue_wait)
+        try:
+            done, _ = await asyncio.wait({future}, timeout=max_wait)
+        except asyncio.CancelledError:
+            self._abandon(priority, future)
+            raise
+        
+        if not done:
+            self._abandon(priority, future)
+            self.shed += 1
+            raise AdmissionRejected("Timed out waiting for admission", retry_after=math.ceil(self.max_queue_wait))
+        
+        # The releasing caller handed its slot straight to us
+        self._admit(priority, time.monotonic() - queued_at)
+
+    def release(self):
+        """Free a slot, handing it to the highest-priority waiter if there is one"""
+        while self._queue:
+            priority, _, future = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self._queued[priority] -= 1
+            future.set_result(None)
+            return
+        self._active -= 1
+
+    def _abandon(self, priority: Priority, future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            # Granted between waking up and giving up: pass the slot on
+            self.release()
+        else:
+            self._queued[priority] -= 1
+            future.cancel()
+
+    def _admit(self, priority: Priority, waited: float):
+        self.admitted += 1
+        histogram = self._wait_histogram[priority]
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if waited <= bound:
+                histogram[i] += 1
+                break
+
+    @property
+    def queue_length(self) -> int:
+        return sum(self._queued.values())
+
+    def get_stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "queue_length": self.queue_length,
+            "queued_by_priority": {priority.name.lower(): count for priority, count in self._queued.items()},
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "wait_seconds_histogram": {
+                priority.name.lower(): {
+                    ("+Inf" if bound == math.inf else str(bound)): count
+                    for bound, count in zip(WAIT_BUCKETS, counts)
+                }
+                for priority, counts in self._wait_histogram.items()
+            }
+        }
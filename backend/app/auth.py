@@ -4,8 +4,10 @@ from datetime import datetime, timedelta
 from typing import Optional
 from app.config import settings
 from app.models import TokenData
+from app.token_cache import verified_token_cache
 import secrets
 import hashlib
+import json
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -18,6 +20,37 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password + settings.PASSWORD_SALT)
 
+# Token signing
+def load_signing_keys(raw: str) -> dict:
+    """Parse JWT_SIGNING_KEYS (a JSON object of key id to secret)"""
+    return json.loads(raw) if raw else {}
+
+signing_keys = load_signing_keys(settings.JWT_SIGNING_KEYS)
+if settings.JWT_ACTIVE_KID and settings.JWT_ACTIVE_KID not in signing_keys:
+    raise ValueError(f"JWT_ACTIVE_KID {settings.JWT_ACTIVE_KID!r} is not in JWT_SIGNING_KEYS")
+
+def _encode(to_encode: dict) -> str:
+    """Sign claims with the active key"""
+    if settings.JWT_ACTIVE_KID:
+        return jwt.encode(
+            to_encode,
+            signing_keys[settings.JWT_ACTIVE_KID],
+            algorithm=settings.JWT_ALGORITHM,
+            headers={"kid": settings.JWT_ACTIVE_KID}
+        )
+    return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+def _decode(token: str) -> dict:
+    """Check a token's signature against the key it names, and its expiry"""
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid is None:
+        key = settings.JWT_SECRET_KEY
+    elif kid in signing_keys:
+        key = signing_keys[kid]
+    else:
+        raise JWTError("Unknown signing key")
+    return jwt.decode(token, key, algorithms=[settings.JWT_ALGORITHM])
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create access token"""
     to_encode = data.copy()
@@ -27,25 +60,73 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    encoded_jwt = _encode(to_encode)
     return encoded_jwt
 
+def create_user_access_token(user: dict) -> str:
+    """Create access token for a user document, carrying its claims if JWT_EMBED_CLAIMS is set"""
+    if not settings.JWT_EMBED_CLAIMS:
+        return create_access_token({"sub": user["email"]})
+    
+    claims = {
+        "sub": user["email"],
+        "uid": str(user["_id"]),
+        "active": user.get("is_active", True),
+        "verified": user.get("is_verified", False),
+        "admin": user.get("is_admin", False),
+        "tier": user.get("tier"),
+        "ver": user.get("token_version", 0)
+    }
+    return create_access_token(claims, timedelta(minutes=settings.JWT_CLAIMS_EXPIRE_MINUTES))
+
 def create_refresh_token(data: dict):
     """Create refresh token"""
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    encoded_jwt = _encode(to_encode)
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[TokenData]:
-    """Verify and decode token"""
+    """Verify and decode access token"""
+    return _verify(token, "access")
+
+def verify_refresh_token(token: str) -> Optional[TokenData]:
+    """Verify and decode refresh token"""
+    return _verify(token, "refresh")
+
+def _verify(token: str, token_type: str) -> Optional[TokenData]:
+    token_data = verified_token_cache.get(token)
+    if token_data is None:
+        token_data = _decode_token_data(token)
+        if token_data is None:
+            return None
+        if token_data.exp is not None:
+            verified_token_cache.put(token, token_data, token_data.exp)
+    
+    if token_data.type != token_type:
+        return None
+    return token_data
+
+def _decode_token_data(token: str) -> Optional[TokenData]:
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        payload = _decode(token)
         email: str = payload.get("sub")
         if email is None:
             return None
-        return TokenData(email=email)
+        return TokenData(
+            email=email,
+            exp=payload.get("exp"),
+            type=payload.get("type"),
+            uid=payload.get("uid"),
+            active=payload.get("active"),
+            verified=payload.get("verified"),
+            admin=payload.get("admin"),
+            tier=payload.get("tier"),
+            ver=payload.get("ver"),
+            jti=payload.get("jti"),
+            fam=payload.get("fam")
+        )
     except JWTError:
         return None
 
@@ -0,0 +1,223 @@
+from app.config import settings
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from typing import Awaitable, Callable, Optional
+import asyncio
+import logging
+import os
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail a job with a client-facing error"""
+
+    def __init__(self, detail: str, status_code: int = 500, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def public_job(job: dict) -> dict:
+    """A job as returned to its owner"""
+    return {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "finished_at": job.get("finished_at"),
+        "result": job.get("result"),
+        "error": job.get("error")
+    }
+
+class ChatJobRunner:
+    """Chat generations run outside the request that asked for them.
+
+    Jobs live in the chat_jobs collection, so any worker process can run a job or
+    answer a poll for it. Each process runs a pool of tasks that claim queued jobs
+    with a lease; a job whose worker died is claimed again once its lease runs out,
+    up to max_attempts times. Finished jobs expire after result_ttl seconds.
+    """
+
+    def __init__(self):
+        self.workers = settings.CHAT_JOB_WORKERS
+        self.poll_interval = settings.CHAT_JOB_POLL_SECONDS
+        self.timeout = settings.CHAT_JOB_TIMEOUT_SECONDS
+        self.max_attempts = settings.CHAT_JOB_MAX_ATTEMPTS
+        self.result_ttl = settings.CHAT_JOB_RESULT_TTL_SECONDS
+        # A lease outlives the job's deadline, so a live worker always finishes before it runs out
+        self.lease_seconds = self.timeout + 60
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._db = None
+        self._handler = None
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        # Set (and replaced) whenever this process finishes a job, to wake local long-polls
+        self._finished = asyncio.Event()
+
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self, db, handler: Callable[[dict, float], Awaitable[dict]]):
+        """Start the worker pool. handler(job, deadline) returns the job's result"""
+        self._db = db
+        self._handler = handler
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(), name=f"chat-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} chat job workers")
+
+    async def stop(self):
+        """Stop the workers; jobs they were running are picked up again once their lease expires"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, db, user_id: str, payload: dict) -> dict:
+        """Queue a job for a user"""
+        now = datetime.utcnow()
+        job = {
+            "user_id": user_id,
+            "status": QUEUED,
+            "payload": payload,
+            "attempts": 0,
+            "created_at": now,
+            # Unclaimed jobs don't outlive their results
+            "expires_at": now + timedelta(seconds=self.lease_seconds * self.max_attempts + self.result_ttl)
+        }
+        result = await db.chat_jobs.insert_one(job)
+        job["_id"] = result.inserted_id
+        self._wakeup.set()
+        return job
+
+    async def count_pending(self, db, user_id: str) -> int:
+        return await db.chat_jobs.count_documents({"user_id": user_id, "status": {"$in": [QUEUED, RUNNING]}})
+
+    async def get(self, db, job_id: str, user_id: str) -> Optional[dict]:
+        try:
+            oid = ObjectId(job_id)
+        except InvalidId:
+            return None
+        job = await db.chat_jobs.find_one({"_id": oid, "user_id": user_id})
+        
+        if (
+            job is not None
+            and job["status"] == RUNNING
+            and job["attempts"] >= self.max_attempts
+            and job["lease_expires_at"] < datetime.utcnow()
+        ):
+            # Its last worker died and no one will claim it again
+            job["status"] = FAILED
+            job["error"] = {"detail": "An error occurred while processing your message", "status_code": 500}
+        return job
+
+    async def wait(self, db, job_id: str, user_id: str, timeout: float) -> Optional[dict]:
+        """Get a job, waiting up to timeout seconds for it to finish"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(db, job_id, user_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED_STATES or remaining <= 0:
+                return job
+            # Woken when this process finishes a job; jobs run by other processes are polled
+            try:
+                await asyncio.wait_for(self._finished.wait(), timeout=min(self.poll_interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self._db.chat_jobs.find_one_and_update(
+            {
+                "$or": [
+                    {"status": QUEUED},
+                    {"status": RUNNING, "lease_expires_at": {"$lt": now}}
+                ],
+                "attempts": {"$lt": self.max_attempts}
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker": self.worker_id,
+                    "started_at": now,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds)
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker_loop(self):
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error claiming chat job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        job_id = str(job["_id"])
+        deadline = time.monotonic() + self.timeout
+        update = {}
+        self.running += 1
+        try:
+            update["result"] = await self._handler(job, deadline)
+            update["status"] = SUCCEEDED
+            self.completed += 1
+        except JobFailed as e:
+            update["error"] = {"detail": e.detail, "status_code": e.status_code, "retry_after": e.retry_after}
+            update["status"] = FAILED
+            self.failed += 1
+        except Exception as e:
+            logger.error(f"Chat job {job_id} failed: {e}")
+            update["error"] = {"detail": "An error occurred while processing your message", "status_code": 500}
+            update["status"] = FAILED
+            self.failed += 1
+        finally:
+            self.running -= 1
+
+        update["finished_at"] = datetime.utcnow()
+        update["expires_at"] = update["finished_at"] + timedelta(seconds=self.result_ttl)
+        await self._db.chat_jobs.update_one(
+            {"_id": job["_id"], "worker": self.worker_id, "status": RUNNING},
+            {"$set": update, "$unset": {"lease_expires_at": ""}}
+        )
+
+        finished, self._finished = self._finished, asyncio.Event()
+        finished.set()
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+# Create chat job runner instance
+chat_job_runner = ChatJobRunner()
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from typing import Any, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class LiveChat:
+    """A model chat object in sync with a stored session"""
+
+    def __init__(self, chat: Any, revision: int, summary_upto: int, messages: int, tokens: int):
+        self.chat = chat
+        # Stored message count the chat's history corresponds to
+        self.revision = revision
+        # Stored messages folded into the summary the chat's history opens with
+        self.summary_upto = summary_upto
+        # Messages and estimated tokens in the chat's history
+        self.messages = messages
+        self.tokens = tokens
+        self.last_used = time.monotonic()
+
+class ChatPool:
+    """Bounded LRU of live chat objects keyed by session id, with idle eviction.
+
+    Entries are checked out for the duration of a turn, so a chat object is never
+    used by two requests at once; a concurrent turn on the same session simply
+    builds a fresh chat.
+    """
+
+    def __init__(self, max_size: int, idle_seconds: int):
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self._chats = OrderedDict()
+        
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def checkout(self, session_id: str, revision: int, summary_upto: int, messages: int) -> Optional[LiveChat]:
+        """Take the live chat for a session if it holds the context selected for this turn"""
+        self._evict_idle()
+        live = self._chats.pop(session_id, None)
+        if live is None:
+            self.misses += 1
+            return None
+        
+        if live.revision != revision or live.summary_upto != summary_upto or live.messages != messages:
+            # The session changed elsewhere (another worker, a failed turn, a cached reply),
+            # its summary moved on, or the context window (message limit or token budget)
+            # slid past the chat's oldest messages
+            self.stale += 1
+            return None
+        
+        self.hits += 1
+        return live
+
+    def checkin(self, session_id: str, chat: Any, revision: int, summary_upto: int, messages: int, tokens: int):
+        """Return a chat to the pool after a successful turn"""
+        self._chats[session_id] = LiveChat(chat, revision, summary_upto, messages, tokens)
+        self._chats.move_to_end(session_id)
+        while len(self._chats) > self.max_size:
+            self._chats.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, session_id: str):
+        """Drop a session's live chat, e.g. after the session is deleted"""
+        self._chats.pop(session_id, None)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._chats:
+            session_id, live = next(iter(self._chats.items()))
+            if live.last_used > cutoff:
+                break
+            del self._chats[session_id]
+            self.evictions += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "size": len(self._chats),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,358 @@
+from bson import ObjectId
+from pymongo import InsertOne, ReplaceOne, ReturnDocument, UpdateOne
+from app.config import settings
+from app.context_builder import estimate_tokens, TOKENS_FIELD
+from datetime import datetime
+from typing import List, Optional, Tuple
+import base64
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Storage modes: messages embedded in the session document, or in fixed-size buckets
+# keyed by (session_id, seq) in the chat_message_buckets collection
+EMBEDDED_STORAGE = "embedded"
+BUCKETED_STORAGE = "bucketed"
+
+# Position of a message within its session, kept on bucketed messages only
+POSITION_FIELD = "n"
+
+# Message fields used by the backend only and never returned to clients
+INTERNAL_MESSAGE_FIELDS = {POSITION_FIELD, TOKENS_FIELD}
+
+# Length of the last-message preview kept on the session for the sidebar
+PREVIEW_LENGTH = 120
+
+# Fields the session listing needs; message_count falls back to the array size for
+# sessions written before the counter existed, computed server-side
+LISTING_PROJECTION = {
+    "title": 1,
+    "title_pending": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "last_message_preview": 1,
+    "message_count": {"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]}
+}
+
+# Session fields needed to build a turn's context; message_count falls back like the listing
+CONTEXT_PROJECTION = {
+    "storage": 1,
+    "summary": 1,
+    "summary_upto": 1,
+    "message_count": LISTING_PROJECTION["message_count"]
+}
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(updated_at: datetime, session_id: ObjectId) -> str:
+    """Encode a (updated_at, _id) keyset position as an opaque cursor"""
+    raw = f"{updated_at.isoformat()}|{session_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, session_id = raw.split("|")
+        return datetime.fromisoformat(updated_at), ObjectId(session_id)
+    except Exception as e:
+        raise InvalidCursorError("Invalid cursor") from e
+
+class ChatStore:
+    """Persistence for chat sessions and their messages"""
+
+    @staticmethod
+    def build_message(role: str, content: str, **extra) -> dict:
+        """Build a message document, caching its token count for context building"""
+        return {
+            "role": role,
+            "content": content,
+            "timestamp": datetime.utcnow(),
+            TOKENS_FIELD: estimate_tokens(content),
+            **extra
+        }
+
+    def __init__(self):
+        self.storage_mode = settings.CHAT_STORAGE_MODE
+        self.bucket_size = settings.CHAT_BUCKET_SIZE
+
+    def new_session(self, user_id: str, title: str, **fields) -> dict:
+        """Build an empty chat session document, with its _id, without inserting it"""
+        session_doc = {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "title": title,
+            "message_count": 0,
+            "last_message_preview": None,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            **fields
+        }
+        if self.storage_mode == BUCKETED_STORAGE:
+            session_doc["storage"] = BUCKETED_STORAGE
+        else:
+            session_doc["messages"] = []
+        return session_doc
+
+    async def create_session(self, db, user_id: str, title: str, **fields) -> dict:
+        """Insert an empty chat session and return its document"""
+        session_doc = self.new_session(user_id, title, **fields)
+        await db.chat_sessions.insert_one(session_doc)
+        return session_doc
+
+    async def load_session(self, db, session_id: str, user_id: str, window: int) -> Optional[dict]:
+        """Load the last `window` messages of a session, or None if it does not belong to the user"""
+        # $slice keeps the read size flat no matter how long the session grows
+        session = await db.chat_sessions.find_one(
+            {"_id": ObjectId(session_id), "user_id": user_id},
+            CONTEXT_PROJECTION | {"messages": {"$slice": -window}}
+        )
+        if session and session.get("storage") == BUCKETED_STORAGE:
+            count = session["message_count"]
+            session["messages"] = await self._load_bucketed(db, session["_id"], max(count - window, 0), count)
+        return session
+
+    async def load_range(self, db, session: dict, start: int, end: int) -> List[dict]:
+        """Load messages in positions [start, end) of a session"""
+        if session.get("storage") == BUCKETED_STORAGE:
+            return await self._load_bucketed(db, session["_id"], start, end)
+        
+        if end <= start:
+            return []
+        doc = await db.chat_sessions.find_one(
+            {"_id": session["_id"]},
+            {"messages": {"$slice": [start, end - start]}}
+        )
+        return doc.get("messages", []) if doc else []
+
+    async def get_session(self, db, session_id: str, user_id: str) -> Optional[dict]:
+        """Load a session with its full message history"""
+        session = await db.chat_sessions.find_one({
+            "_id": ObjectId(session_id),
+            "user_id": user_id
+        })
+        if session and session.get("storage") == BUCKETED_STORAGE:
+            session["messages"] = await self._load_bucketed(db, session["_id"], 0, session.get("message_count", 0))
+        return session
+
+    async def append_messages(self, db, session: dict, messages: List[dict]):
+        """Append messages to a session"""
+        update = {
+            "$inc": {"message_count": len(messages)},
+            "$set": {
+                "last_message_preview": messages[-1]["content"][:PREVIEW_LENGTH],
+                "updated_at": datetime.utcnow()
+            }
+        }
+        
+        if session.get("storage") != BUCKETED_STORAGE:
+            # Embedded: the whole turn is a single write
+            update["$push"] = {"messages": {"$each": messages}}
+            result = await db.chat_sessions.update_one(
+                {"_id": session["_id"], "message_count": {"$exists": True}},
+                update
+            )
+            if result.matched_count == 0:
+                # Sessions created before the counter existed get it backfilled once
+                await db.chat_sessions.update_one(
+                    {"_id": session["_id"], "message_count": {"$exists": False}},
+                    [{"$set": {"message_count": {"$size": {"$ifNull": ["$messages", []]}}}}]
+                )
+                await db.chat_sessions.update_one({"_id": session["_id"]}, update)
+            return
+        
+        # Bucketed: reserve positions on the session, then push into the owning buckets
+        updated = await db.chat_sessions.find_one_and_update(
+            {"_id": session["_id"]},
+            update,
+            projection={"message_count": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        start = updated["message_count"] - len(messages)
+        positioned = [{**message, POSITION_FIELD: start + i} for i, message in enumerate(messages)]
+        await self._push_to_buckets(db, session["_id"], positioned)
+
+    async def save_turns(self, db, turns: List[Tuple[dict, List[dict], bool]]):
+        """Persist many (session, messages, is_new) turns with bulk writes.
+
+        New sessions come from new_session() and are inserted along with their messages.
+        Appends to embedded sessions are batched too; bucketed sessions, and sessions from
+        before the message counter, go through append_messages one at a time.
+        """
+        now = datetime.utcnow()
+        session_operations = []
+        bucket_operations = []
+        one_by_one = []
+        
+        # load_session always computes message_count, so ask which sessions actually store it
+        existing_ids = [session["_id"] for session, _, is_new in turns if not is_new]
+        uncounted = set()
+        if existing_ids:
+            uncounted = {
+                doc["_id"]
+                async for doc in db.chat_sessions.find(
+                    {"_id": {"$in": existing_ids}, "message_count": {"$exists": False}}, {"_id": 1}
+                )
+            }
+        
+        for session, messages, is_new in turns:
+            preview = messages[-1]["content"][:PREVIEW_LENGTH]
+            if is_new:
+                doc = {**session, "message_count": len(messages), "last_message_preview": preview, "updated_at": now}
+                if session.get("storage") == BUCKETED_STORAGE:
+                    # No one else knows the session yet, so positions need no reservation
+                    positioned = [{**message, POSITION_FIELD: i} for i, message in enumerate(messages)]
+                    bucket_operations += self._bucket_operations(session["_id"], positioned)
+                else:
+                    doc["messages"] = messages
+                session_operations.append(InsertOne(doc))
+            elif session.get("storage") != BUCKETED_STORAGE and session["_id"] not in uncounted:
+                session_operations.append(UpdateOne(
+                    {"_id": session["_id"], "message_count": {"$exists": True}},
+                    {
+                        "$push": {"messages": {"$each": messages}},
+                        "$inc": {"message_count": len(messages)},
+                        "$set": {"last_message_preview": preview, "updated_at": now}
+                    }
+                ))
+            else:
+                one_by_one.append((session, messages))
+        
+        if session_operations:
+            await db.chat_sessions.bulk_write(session_operations, ordered=False)
+        if bucket_operations:
+            await db.chat_message_buckets.bulk_write(bucket_operations, ordered=False)
+        for session, messages in one_by_one:
+            await self.append_messages(db, session, messages)
+
+    async def delete_session(self, db, session_id: str, user_id: str) -> bool:
+        """Delete a session and its message buckets"""
+        result = await db.chat_sessions.delete_one({
+            "_id": ObjectId(session_id),
+            "user_id": user_id
+        })
+        if result.deleted_count == 0:
+            return False
+        
+        await db.chat_message_buckets.delete_many({"session_id": ObjectId(session_id)})
+        return True
+
+    async def migrate_session_to_buckets(self, db, session: dict) -> bool:
+        """Move an embedded session's messages into buckets. Safe to repeat after a partial run"""
+        messages = session.get("messages", [])
+        positioned = [{**message, POSITION_FIELD: i} for i, message in enumerate(messages)]
+        
+        # Whole buckets are replaced, so re-running after an interruption rewrites the same documents
+        operations = [
+            ReplaceOne(
+                {"session_id": session["_id"], "seq": seq},
+                {"session_id": session["_id"], "seq": seq, "messages": bucket},
+                upsert=True
+            )
+            for seq, bucket in self._group_by_bucket(positioned).items()
+        ]
+        if operations:
+            await db.chat_message_buckets.bulk_write(operations, ordered=False)
+        
+        # Only flip the session if no message was appended while its buckets were written
+        result = await db.chat_sessions.update_one(
+            {
+                "_id": session["_id"],
+                "storage": {"$ne": BUCKETED_STORAGE},
+                "messages": {"$size": len(messages)}
+            },
+            {
+                "$set": {"storage": BUCKETED_STORAGE, "message_count": len(messages)},
+                "$unset": {"messages": ""}
+            }
+        )
+        return result.modified_count == 1
+
+    def _group_by_bucket(self, positioned: List[dict]) -> dict:
+        """Group positioned messages by the bucket that owns them"""
+        buckets = {}
+        for message in positioned:
+            buckets.setdefault(message[POSITION_FIELD] // self.bucket_size, []).append(message)
+        return buckets
+
+    def _bucket_operations(self, session_id: ObjectId, positioned: List[dict]) -> List[UpdateOne]:
+        """Upserts appending positioned messages to the buckets that own them"""
+        return [
+            UpdateOne(
+                {"session_id": session_id, "seq": seq},
+                {"$push": {"messages": {"$each": bucket}}},
+                upsert=True
+            )
+            for seq, bucket in self._group_by_bucket(positioned).items()
+        ]
+
+    async def _push_to_buckets(self, db, session_id: ObjectId, positioned: List[dict]):
+        """Append positioned messages to their buckets, creating buckets as needed"""
+        await db.chat_message_buckets.bulk_write(self._bucket_operations(session_id, positioned), ordered=False)
+
+    async def _load_bucketed(self, db, session_id: ObjectId, start: int, end: int) -> List[dict]:
+        """Load messages in positions [start, end) from the buckets that hold them"""
+        if end <= start:
+            return []
+        
+        buckets = await db.chat_message_buckets.find({
+            "session_id": session_id,
+            "seq": {"$gte": start // self.bucket_size, "$lte": (end - 1) // self.bucket_size}
+        }).to_list(length=None)
+        
+        # Concurrent appends may land out of order within a bucket, so order by position
+        messages = [message for bucket in buckets for message in bucket["messages"]]
+        messages.sort(key=lambda message: message[POSITION_FIELD])
+        return [message for message in messages if start <= message[POSITION_FIELD] < end]
+
+    @staticmethod
+    def public_message(message: dict) -> dict:
+        """Strip storage-internal fields from a message before returning it to clients"""
+        return {key: value for key, value in message.items() if key not in INTERNAL_MESSAGE_FIELDS}
+
+    async def list_sessions(self, db, user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """List a user's sessions newest first, returning a page and the cursor for the next one"""
+        query = {"user_id": user_id}
+        if cursor:
+            updated_at, session_id = decode_cursor(cursor)
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$lt": session_id}}
+            ]
+        
+        # Fetch one extra row to learn whether another page exists
+        sessions = await db.chat_sessions.find(query, LISTING_PROJECTION).sort(
+            [("updated_at", -1), ("_id", -1)]
+        ).limit(limit + 1).to_list(length=limit + 1)
+        
+        next_cursor = None
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            last = sessions[-1]
+            next_cursor = encode_cursor(last["updated_at"], last["_id"])
+        
+        return sessions, next_cursor
+
+    async def set_summary(self, db, session_id: ObjectId, summary: str, previous_upto: int, upto: int) -> bool:
+        """Store a rolling summary covering messages [0, upto), unless another job got there first"""
+        covered = {"summary_upto": previous_upto} if previous_upto else {"summary_upto": {"$in": [0, None]}}
+        result = await db.chat_sessions.update_one(
+            {"_id": session_id, **covered},
+            {"$set": {"summary": summary, "summary_upto": upto}}
+        )
+        return result.modified_count == 1
+
+    async def set_title(self, db, session_id: str, title: str) -> bool:
+        """Replace a pending placeholder title. Returns whether the title was set"""
+        result = await db.chat_sessions.update_one(
+            {"_id": ObjectId(session_id), "title_pending": True},
+            {
+                "$set": {"title": title},
+                "$unset": {"title_pending": ""}
+            }
+        )
+        return result.modified_count > 0
+
+# Create chat store instance
+chat_store = ChatStore()
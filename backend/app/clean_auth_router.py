@@ -2,13 +2,22 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from app.models import (
     UserCreate, UserResponse, Token, LoginRequest, 
-    MessageResponse
+    MessageResponse, RefreshRequest, ForgotPasswordRequest,
+    ResetPasswordRequest, VerifyEmailRequest
 )
-from app.auth import verify_token, get_password_hash, verify_password
+from app.auth import (
+    create_user_access_token, verify_token, verify_refresh_token,
+    generate_reset_token, hash_token
+)
+from app.email_service import email_service
+from app.refresh_tokens import refresh_token_store, RefreshTokenReused
+from app.user_cache import user_cache
+from app.token_revocation import revocation_list
+from app.password_hasher import password_hasher, PasswordHasherBusy
 from app.demo_auth import demo_auth
 from app.database import get_database, is_database_available
 from app.dependencies import require_database
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
 import logging
 
@@ -36,7 +45,7 @@ async def signup(user: UserCreate):
             user_doc = {
                 "email": user.email,
                 "full_name": user.full_name,
-                "hashed_password": get_password_hash(user.password),
+                "hashed_password": await password_hasher.hash(user.password),
                 "is_active": True,
                 "is_verified": True,  # Auto-verify for demo
                 "is_admin": user.email == "StructMind@ai.com",
@@ -52,7 +61,7 @@ async def signup(user: UserCreate):
             # Use demo version
             logger.info("Database not available, using demo authentication")
             try:
-                demo_auth.create_user(user)
+                await demo_auth.create_user(user)
                 logger.info(f"Demo user created: {user.email}")
             except ValueError as e:
                 raise HTTPException(
@@ -65,7 +74,7 @@ async def signup(user: UserCreate):
             success=True
         )
         
-    except HTTPException:
+    except (HTTPException, PasswordHasherBusy):
         raise
     except Exception as e:
         logger.error(f"Signup error: {e}")
@@ -89,13 +98,13 @@ async def login(login_data: LoginRequest):
             user = await db.users.find_one({"email": login_data.email})
             logger.info(f"Database user lookup: {'Found' if user else 'Not found'}")
             
-            if user and not verify_password(login_data.password, user["hashed_password"]):
+            if user and not await password_hasher.verify(login_data.password, user["hashed_password"]):
                 user = None
                 
         else:
             # Use demo version
             logger.info("Database not available, using demo authentication")
-            user = demo_auth.authenticate_user(login_data.email, login_data.password)
+            user = await demo_auth.authenticate_user(login_data.email, login_data.password)
             logger.info(f"Demo user authentication: {'Success' if user else 'Failed'}")
         
         if not user:
@@ -114,9 +123,8 @@ async def login(login_data: LoginRequest):
         
         # Create tokens
         if is_database_available():
-            from app.auth import create_access_token, create_refresh_token
-            access_token = create_access_token({"sub": user["email"]})
-            refresh_token = create_refresh_token({"sub": user["email"]})
+            access_token = create_user_access_token(user)
+            refresh_token = await refresh_token_store.issue(get_database(), user["email"])
             token = Token(
                 access_token=access_token,
                 refresh_token=refresh_token,
@@ -128,7 +136,7 @@ async def login(login_data: LoginRequest):
         logger.info(f"Login successful for email: {login_data.email}")
         return token
         
-    except HTTPException:
+    except (HTTPException, PasswordHasherBusy):
         raise
     except Exception as e:
         logger.error(f"Login error: {e}")
@@ -137,6 +145,209 @@ async def login(login_data: LoginRequest):
             detail="An error occurred during login"
         )
 
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest):
+    """Exchange a refresh token for new tokens, without a password login"""
+    invalid_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token"
+    )
+    
+    token_data = verify_refresh_token(request.refresh_token)
+    if token_data is None:
+        raise invalid_exception
+    
+    try:
+        if not is_database_available():
+            # Demo tokens aren't tracked, so they aren't rotated either
+            user = demo_auth.get_user_by_email(token_data.email)
+            if not user or not user.get("is_active", True):
+                raise invalid_exception
+            return demo_auth.create_tokens(user)
+        
+        db = get_database()
+        try:
+            refresh_token = await refresh_token_store.rotate(db, token_data)
+        except RefreshTokenReused:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token was already used. Please log in again."
+            )
+        if refresh_token is None:
+            raise invalid_exception
+        
+        user = await db.users.find_one({"email": token_data.email})
+        if not user or not user.get("is_active", True):
+            await refresh_token_store.revoke_family(db, token_data.fam)
+            raise invalid_exception
+        
+        return Token(
+            access_token=create_user_access_token(user),
+            refresh_token=refresh_token,
+            token_type="bearer"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Token refresh error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while refreshing the session"
+        )
+
+@router.post("/verify-email", response_model=MessageResponse)
+async def verify_email(request: VerifyEmailRequest, db = Depends(require_database)):
+    """Verify email address"""
+    try:
+        # Find verification record
+        verification = await db.email_verifications.find_one({
+            "token": hash_token(request.token),
+            "expires_at": {"$gt": datetime.utcnow()}
+        })
+        
+        if not verification:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid or expired verification token"
+            )
+        
+        # Update user as verified
+        result = await db.users.update_one(
+            {"email": verification["email"]},
+            {
+                "$set": {
+                    "is_verified": True,
+                    "updated_at": datetime.utcnow()
+                }
+            }
+        )
+        
+        if result.modified_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        await user_cache.invalidate(db, verification["email"])
+        await revocation_list.revoke(db, verification["email"])
+        
+        # Delete verification token
+        await db.email_verifications.delete_one({"_id": verification["_id"]})
+        
+        return MessageResponse(
+            message="Email verified successfully! You can now log in.",
+            success=True
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Email verification error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred during email verification"
+        )
+
+@router.post("/forgot-password", response_model=MessageResponse)
+async def forgot_password(request: ForgotPasswordRequest, db = Depends(require_database)):
+    """Request password reset"""
+    try:
+        # Check if user exists
+        user = await db.users.find_one({"email": request.email})
+        if not user:
+            # Return success even if user doesn't exist (security)
+            return MessageResponse(
+                message="If an account with this email exists, a password reset link has been sent.",
+                success=True
+            )
+        
+        # Generate reset token
+        reset_token = generate_reset_token()
+        reset_doc = {
+            "email": request.email,
+            "token": hash_token(reset_token),
+            "expires_at": datetime.utcnow() + timedelta(hours=1),
+            "created_at": datetime.utcnow()
+        }
+        
+        # Store reset token (replace any existing ones)
+        await db.password_resets.delete_many({"email": request.email})
+        await db.password_resets.insert_one(reset_doc)
+        
+        # Send reset email
+        email_sent = await email_service.send_password_reset_email(request.email, reset_token)
+        
+        if not email_sent:
+            logger.warning(f"Failed to send password reset email to {request.email}")
+        
+        return MessageResponse(
+            message="If an account with this email exists, a password reset link has been sent.",
+            success=True
+        )
+        
+    except Exception as e:
+        logger.error(f"Forgot password error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while processing your request"
+        )
+
+@router.post("/reset-password", response_model=MessageResponse)
+async def reset_password(request: ResetPasswordRequest, db = Depends(require_database)):
+    """Reset password with token"""
+    try:
+        # Find reset record
+        reset_record = await db.password_resets.find_one({
+            "token": hash_token(request.token),
+            "expires_at": {"$gt": datetime.utcnow()}
+        })
+        
+        if not reset_record:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid or expired reset token"
+            )
+        
+        # Hash new password
+        hashed_password = await password_hasher.hash(request.new_password)
+        
+        # Update user password
+        result = await db.users.update_one(
+            {"email": reset_record["email"]},
+            {
+                "$set": {
+                    "hashed_password": hashed_password,
+                    "updated_at": datetime.utcnow()
+                }
+            }
+        )
+        
+        if result.modified_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        await user_cache.invalidate(db, reset_record["email"])
+        await revocation_list.revoke(db, reset_record["email"])
+        await refresh_token_store.revoke_user(db, reset_record["email"])
+        
+        # Delete reset token
+        await db.password_resets.delete_one({"_id": reset_record["_id"]})
+        
+        return MessageResponse(
+            message="Password reset successfully! You can now log in with your new password.",
+            success=True
+        )
+        
+    except (HTTPException, PasswordHasherBusy):
+        raise
+    except Exception as e:
+        logger.error(f"Password reset error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred during password reset"
+        )
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(token: str = Depends(verify_token)):
     """Get current user information"""
@@ -17,11 +17,23 @@ class Settings(BaseSettings):
     # JWT settings
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "")
     JWT_ALGORITHM: str = "HS256"
+    # Key rotation: a JSON object of key id to secret; new tokens are signed with JWT_ACTIVE_KID,
+    # and tokens without a key id are still checked against JWT_SECRET_KEY
+    JWT_SIGNING_KEYS: str = os.getenv("JWT_SIGNING_KEYS", "")
+    JWT_ACTIVE_KID: str = os.getenv("JWT_ACTIVE_KID", "")
+    JWT_VERIFIED_CACHE_MAX_ENTRIES: int = int(os.getenv("JWT_VERIFIED_CACHE_MAX_ENTRIES", "10000"))
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Sign the user's status and role into short-lived access tokens, so that most requests
+    # skip the user lookup; changing a user revokes the tokens issued to them before
+    JWT_EMBED_CLAIMS: bool = os.getenv("JWT_EMBED_CLAIMS", "False").lower() == "true"
+    JWT_CLAIMS_EXPIRE_MINUTES: int = int(os.getenv("JWT_CLAIMS_EXPIRE_MINUTES", "15"))
+    JWT_REVOCATION_REFRESH_SECONDS: float = float(os.getenv("JWT_REVOCATION_REFRESH_SECONDS", "5"))
     
     # Password settings
     PASSWORD_SALT: str = os.getenv("PASSWORD_SALT", "")
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
     
     # Frontend URL
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:5173")
@@ -35,8 +47,86 @@ class Settings(BaseSettings):
     # Google OAuth
     GOOGLE_OAUTH_CLIENT_ID: str = os.getenv("GOOGLE_OAUTH_CLIENT_ID", "")
     
+    # LLM backend: "gemini", or "fake" for offline load testing
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "gemini")
+    FAKE_LLM_LATENCY_MEDIAN_MS: float = float(os.getenv("FAKE_LLM_LATENCY_MEDIAN_MS", "800"))
+    FAKE_LLM_LATENCY_P99_MS: float = float(os.getenv("FAKE_LLM_LATENCY_P99_MS", "3000"))
+    FAKE_LLM_REPLY_CHARS: int = int(os.getenv("FAKE_LLM_REPLY_CHARS", "600"))
+    FAKE_LLM_CHUNK_CHARS: int = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "40"))
+    FAKE_LLM_CHUNK_INTERVAL_MS: float = float(os.getenv("FAKE_LLM_CHUNK_INTERVAL_MS", "50"))
+    FAKE_LLM_ERROR_RATE: float = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+    FAKE_LLM_STREAM_ERROR_RATE: float = float(os.getenv("FAKE_LLM_STREAM_ERROR_RATE", "0"))
+    FAKE_LLM_SEED: int = int(os.getenv("FAKE_LLM_SEED", "0"))
+    
     # Gemini API
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+    GEMINI_MAX_QUEUE_WAIT_SECONDS: float = float(os.getenv("GEMINI_MAX_QUEUE_WAIT_SECONDS", "10"))
+    GEMINI_MAX_QUEUE_LENGTH: int = int(os.getenv("GEMINI_MAX_QUEUE_LENGTH", "200"))
+    GEMINI_COALESCE_ENABLED: bool = os.getenv("GEMINI_COALESCE_ENABLED", "True").lower() == "true"
+    GEMINI_CHAT_POOL_SIZE: int = int(os.getenv("GEMINI_CHAT_POOL_SIZE", "512"))
+    GEMINI_CHAT_POOL_IDLE_SECONDS: int = int(os.getenv("GEMINI_CHAT_POOL_IDLE_SECONDS", "900"))
+    GEMINI_CACHE_ENABLED: bool = os.getenv("GEMINI_CACHE_ENABLED", "False").lower() == "true"
+    GEMINI_CACHE_MAX_ENTRIES: int = int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "1000"))
+    GEMINI_CACHE_MAX_BYTES: int = int(os.getenv("GEMINI_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    GEMINI_CACHE_TTL_SECONDS: int = int(os.getenv("GEMINI_CACHE_TTL_SECONDS", "3600"))
+    GEMINI_DEFAULT_TIMEOUT_SECONDS: float = float(os.getenv("GEMINI_DEFAULT_TIMEOUT_SECONDS", "60"))
+    GEMINI_ATTEMPT_TIMEOUT_SECONDS: float = float(os.getenv("GEMINI_ATTEMPT_TIMEOUT_SECONDS", "30"))
+    GEMINI_STREAM_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("GEMINI_STREAM_IDLE_TIMEOUT_SECONDS", "30"))
+    GEMINI_MAX_RETRIES: int = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+    GEMINI_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("GEMINI_RETRY_BASE_DELAY_SECONDS", "0.5"))
+    GEMINI_RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("GEMINI_RETRY_MAX_DELAY_SECONDS", "8"))
+    GEMINI_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("GEMINI_BREAKER_FAILURE_THRESHOLD", "5"))
+    GEMINI_BREAKER_RESET_SECONDS: float = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+    
+    # Chat
+    CHAT_CONTEXT_MESSAGES: int = int(os.getenv("CHAT_CONTEXT_MESSAGES", "50"))
+    CHAT_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "4000"))
+    CHAT_SUMMARY_ENABLED: bool = os.getenv("CHAT_SUMMARY_ENABLED", "True").lower() == "true"
+    CHAT_SUMMARY_TRIGGER_MESSAGES: int = int(os.getenv("CHAT_SUMMARY_TRIGGER_MESSAGES", "40"))
+    CHAT_SUMMARY_KEEP_RECENT: int = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT", "10"))
+    CHAT_STORAGE_MODE: str = os.getenv("CHAT_STORAGE_MODE", "embedded")  # "embedded" or "bucketed"
+    CHAT_BUCKET_SIZE: int = int(os.getenv("CHAT_BUCKET_SIZE", "50"))
+    CHAT_SAVE_USER_MESSAGE_ON_ERROR: bool = os.getenv("CHAT_SAVE_USER_MESSAGE_ON_ERROR", "True").lower() == "true"
+    CHAT_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_REQUEST_TIMEOUT_SECONDS", "60"))
+    CHAT_MIN_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_MIN_REQUEST_TIMEOUT_SECONDS", "5"))
+    
+    # Idempotency-Key support on POST /chat/
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_MAX_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_MAX_WAIT_SECONDS", "65"))
+    
+    # Background chat jobs
+    CHAT_JOB_WORKERS: int = int(os.getenv("CHAT_JOB_WORKERS", "4"))
+    CHAT_JOB_POLL_SECONDS: float = float(os.getenv("CHAT_JOB_POLL_SECONDS", "1"))
+    CHAT_JOB_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_JOB_TIMEOUT_SECONDS", "300"))
+    CHAT_JOB_MAX_ATTEMPTS: int = int(os.getenv("CHAT_JOB_MAX_ATTEMPTS", "2"))
+    CHAT_JOB_MAX_PENDING_PER_USER: int = int(os.getenv("CHAT_JOB_MAX_PENDING_PER_USER", "5"))
+    CHAT_JOB_RESULT_TTL_SECONDS: int = int(os.getenv("CHAT_JOB_RESULT_TTL_SECONDS", "3600"))
+    CHAT_JOB_MAX_WAIT_SECONDS: float = float(os.getenv("CHAT_JOB_MAX_WAIT_SECONDS", "30"))
+    
+    # Batch chat
+    CHAT_BATCH_MAX_ITEMS: int = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+    CHAT_BATCH_MAX_PARALLEL: int = int(os.getenv("CHAT_BATCH_MAX_PARALLEL", "8"))
+    CHAT_BATCH_WRITE_SIZE: int = int(os.getenv("CHAT_BATCH_WRITE_SIZE", "50"))
+    
+    # Chat WebSocket
+    WS_AUTH_TIMEOUT_SECONDS: float = float(os.getenv("WS_AUTH_TIMEOUT_SECONDS", "10"))
+    WS_HEARTBEAT_SECONDS: float = float(os.getenv("WS_HEARTBEAT_SECONDS", "25"))
+    WS_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+    WS_MAX_IN_FLIGHT: int = int(os.getenv("WS_MAX_IN_FLIGHT", "4"))
+    
+    # Cache of authenticated users; changes reach other workers within the poll interval
+    USER_CACHE_ENABLED: bool = os.getenv("USER_CACHE_ENABLED", "True").lower() == "true"
+    USER_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+    USER_CACHE_INVALIDATION_POLL_SECONDS: float = float(os.getenv("USER_CACHE_INVALIDATION_POLL_SECONDS", "2"))
+    
+    # Rate limiting for chat generation
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "mongo"
+    RATE_LIMIT_TIERS: str = os.getenv("RATE_LIMIT_TIERS", "")  # JSON overrides, see rate_limit.DEFAULT_TIERS
+    RATE_LIMIT_LEASE_SECONDS: int = int(os.getenv("RATE_LIMIT_LEASE_SECONDS", "300"))
     
     # MongoDB
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
@@ -0,0 +1,84 @@
+from app.config import settings
+from typing import List, NamedTuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Field on stored messages holding their token count, computed once at write time
+TOKENS_FIELD = "tokens"
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text (roughly 4 characters per token)"""
+    return max(1, (len(text) + 3) // 4)
+
+def message_tokens(message: dict) -> int:
+    """Token count of a stored message, using the cached count when present"""
+    tokens = message.get(TOKENS_FIELD)
+    if tokens is None:
+        # Messages written before token counts were cached
+        tokens = estimate_tokens(message["content"])
+    return tokens
+
+def summary_messages(summary: str) -> List[dict]:
+    """Frame a conversation summary as an opening exchange Gemini can take as history"""
+    return [
+        {"role": "user", "content": f"Here is a summary of our conversation so far:\n{summary}"},
+        {"role": "assistant", "content": "Got it, I'll keep that context in mind."}
+    ]
+
+class ContextWindow(NamedTuple):
+    messages: List[dict]
+    history_tokens: int
+    prompt_tokens: int
+
+class ContextBuilder:
+    """Select the conversation history sent to the model within a token budget"""
+
+    def __init__(self):
+        self.token_budget = settings.CHAT_CONTEXT_TOKEN_BUDGET
+        # Upper bound on messages loaded from the database per turn
+        self.max_messages = settings.CHAT_CONTEXT_MESSAGES
+
+    def build(self, chat_history: List[dict], message: str, summary: Optional[str] = None) -> ContextWindow:
+        """Fill the budget with history from newest to oldest, leaving room for the new message"""
+        message_cost = estimate_tokens(message)
+        budget = self.token_budget - message_cost
+        
+        # A rolling summary of older turns always goes first and is paid for up front
+        preamble = summary_messages(summary) if summary else []
+        preamble_tokens = sum(message_tokens(msg) for msg in preamble)
+        budget -= preamble_tokens
+        
+        selected = []
+        used = 0
+        for msg in reversed(chat_history[-self.max_messages:]):
+            tokens = message_tokens(msg)
+            if used + tokens > budget:
+                break
+            selected.append(msg)
+            used += tokens
+        selected.reverse()
+        
+        # The history sent to Gemini has to open with a user turn
+        while selected and selected[0]["role"] != "user":
+            used -= message_tokens(selected.pop(0))
+        
+        used += preamble_tokens
+        return ContextWindow(
+            messages=preamble + selected,
+            history_tokens=used,
+            prompt_tokens=used + message_cost
+        )
+
+    def build_for_session(self, session: dict, message: str) -> ContextWindow:
+        """Build the context for a session loaded by ChatStore.load_session"""
+        history = session.get("messages", [])
+        summary = session.get("summary")
+        if summary:
+            # Drop loaded messages already folded into the summary
+            first_position = session.get("message_count", len(history)) - len(history)
+            history = history[max(session.get("summary_upto", 0) - first_position, 0):]
+        return self.build(history, message, summary)
+
+# Create context builder instance
+context_builder = ContextBuilder()
@@ -60,6 +60,33 @@ async def create_indexes():
         # Chat history indexes
         await db.database.chat_history.create_index([("user_id", 1), ("created_at", -1)])
         
+        # Chat session listing: keyset pagination on (updated_at, _id) per user
+        await db.database.chat_sessions.create_index([("user_id", 1), ("updated_at", -1), ("_id", -1)])
+        
+        # Bucketed chat messages
+        await db.database.chat_message_buckets.create_index([("session_id", 1), ("seq", 1)], unique=True)
+        
+        # Background chat jobs: claimed oldest first, counted per user, removed once expired
+        await db.database.chat_jobs.create_index([("status", 1), ("created_at", 1)])
+        await db.database.chat_jobs.create_index([("user_id", 1), ("status", 1)])
+        await db.database.chat_jobs.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Stored responses of idempotent requests
+        await db.database.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Cross-worker user cache invalidation signals
+        await db.database.user_invalidations.create_index("at")
+        await db.database.user_invalidations.create_index("expires_at", expireAfterSeconds=0)
+        await db.database.token_revocations.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Rotating refresh tokens: revoked per family or user, removed once expired
+        await db.database.refresh_tokens.create_index("family")
+        await db.database.refresh_tokens.create_index("email")
+        await db.database.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+        
+        # Rate limit state expires once a user has been idle for a while
+        await db.database.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+        
         # Email verification indexes
         await db.database.email_verifications.create_index("token", unique=True)
         await db.database.email_verifications.create_index("expires_at")
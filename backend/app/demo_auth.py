@@ -3,7 +3,8 @@
 from typing import Dict, Optional
 from datetime import datetime
 from app.models import UserCreate, UserInDB, UserResponse, Token
-from app.auth import get_password_hash, verify_password, create_access_token, create_refresh_token
+from app.auth import get_password_hash, create_access_token, create_refresh_token
+from app.password_hasher import password_hasher
 import logging
 
 logger = logging.getLogger(__name__)
@@ -42,7 +43,7 @@ class DemoAuthService:
     """Demo authentication service that works without database"""
     
     @staticmethod
-    def create_user(user_data: UserCreate) -> dict:
+    async def create_user(user_data: UserCreate) -> dict:
         """Create a new demo user"""
         if user_data.email in demo_users:
             raise ValueError("User already exists")
@@ -52,7 +53,7 @@ class DemoAuthService:
             "_id": user_id,
             "email": user_data.email,
             "full_name": user_data.full_name,
-            "hashed_password": get_password_hash(user_data.password),
+            "hashed_password": await password_hasher.hash(user_data.password),
             "is_active": True,
             "is_verified": True,  # Auto-verify for demo
             "is_admin": False,
@@ -68,13 +69,13 @@ class DemoAuthService:
         return demo_users.get(email)
     
     @staticmethod
-    def authenticate_user(email: str, password: str) -> Optional[dict]:
+    async def authenticate_user(email: str, password: str) -> Optional[dict]:
         """Authenticate user with email and password"""
         user = demo_users.get(email)
         if not user:
             return None
         
-        if not verify_password(password, user["hashed_password"]):
+        if not await password_hasher.verify(password, user["hashed_password"]):
             return None
             
         return user
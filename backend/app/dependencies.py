@@ -1,11 +1,17 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.auth import verify_token
 from app.database import get_database
-from app.models import UserInDB
+from app.models import TokenUser, UserInDB
 from app.config import settings
+from app.rate_limit import rate_limiter, RateLimitExceeded
+from app.user_cache import user_cache
+from app.token_revocation import revocation_list
 from bson import ObjectId
+from contextlib import asynccontextmanager
+from typing import Optional, Union
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +31,20 @@ async def get_current_user(
     db = Depends(get_database)
 ) -> UserInDB:
     """Get current authenticated user"""
+    return await _require_user(credentials.credentials, db, trust_claims=False)
+
+async def get_authenticated_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db = Depends(get_database)
+) -> Union[TokenUser, UserInDB]:
+    """Get current authenticated user, from the token's own claims when they can be trusted.
+
+    Only the fields of TokenUser are guaranteed; handlers that need the profile depend on
+    get_current_user instead.
+    """
+    return await _require_user(credentials.credentials, db, trust_claims=True)
+
+async def _require_user(token: str, db, trust_claims: bool):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -38,20 +58,50 @@ async def get_current_user(
             detail="Database service is currently unavailable. Please try again later."
         )
     
+    user = await authenticate_token(token, db, trust_claims=trust_claims)
+    if user is None:
+        raise credentials_exception
+    
+    return user
+
+async def authenticate_token(token: str, db, trust_claims: bool = False) -> Optional[Union[TokenUser, UserInDB]]:
+    """Resolve the user a bearer token belongs to, or None if the token is not valid.
+
+    With trust_claims, a self-contained token whose user has not changed since it was
+    issued is answered from its claims alone.
+    """
     try:
-        token_data = verify_token(credentials.credentials)
-        if token_data is None or token_data.email is None:
-            raise credentials_exception
+        token_data = verify_token(token)
     except Exception:
-        raise credentials_exception
+        return None
+    if token_data is None or token_data.email is None:
+        return None
+    
+    if trust_claims and token_data.uid is not None and revocation_list.trusts(token_data.uid, token_data.ver):
+        return TokenUser(
+            id=token_data.uid,
+            email=token_data.email,
+            is_active=token_data.active,
+            is_verified=token_data.verified,
+            is_admin=token_data.admin,
+            tier=token_data.tier
+        )
     
+    cached = user_cache.get(token_data.email)
+    if cached is not None:
+        return cached
+    
+    generation = user_cache.generation
     user = await db.users.find_one({"email": token_data.email})
     if user is None:
-        raise credentials_exception
+        return None
     
-    return UserInDB(**user)
+    user["_id"] = str(user["_id"])
+    user = UserInDB(**user)
+    user_cache.put(user, generation)
+    return user
 
-async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)) -> UserInDB:
+async def get_current_active_user(current_user: UserInDB = Depends(get_authenticated_user)) -> UserInDB:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -66,6 +116,42 @@ async def get_current_verified_user(current_user: UserInDB = Depends(get_current
         )
     return current_user
 
+async def get_rate_limited_user(
+    current_user: UserInDB = Depends(get_current_verified_user),
+    db = Depends(get_database)
+):
+    """Get current verified user, holding one of their rate-limited request slots for the request"""
+    async with rate_limited(db, current_user):
+        yield current_user
+
+@asynccontextmanager
+async def rate_limited(db, current_user):
+    """Hold one of the user's rate-limited request slots, raising 429 if none is available"""
+    try:
+        lease_id = await rate_limiter.acquire(db, current_user)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    try:
+        yield
+    finally:
+        await rate_limiter.release(db, current_user, lease_id)
+
+def get_request_deadline(x_request_timeout: Optional[float] = Header(None)) -> float:
+    """Deadline for the request's upstream work, as a time.monotonic() timestamp.
+
+    Clients may ask for a shorter budget than CHAT_REQUEST_TIMEOUT_SECONDS with X-Request-Timeout,
+    down to CHAT_MIN_REQUEST_TIMEOUT_SECONDS.
+    """
+    timeout = settings.CHAT_REQUEST_TIMEOUT_SECONDS
+    if x_request_timeout is not None:
+        timeout = min(timeout, max(x_request_timeout, settings.CHAT_MIN_REQUEST_TIMEOUT_SECONDS))
+    return time.monotonic() + timeout
+
 async def get_current_admin_user(current_user: UserInDB = Depends(get_current_verified_user)) -> UserInDB:
     """Get current admin user"""
     if not current_user.is_admin:
@@ -1,51 +1,439 @@
-import google.generativeai as genai
 from app.config import settings
+from app.admission import AdmissionController, AdmissionRejected, Priority
+from app.chat_pool import ChatPool
+from app.context_builder import estimate_tokens, message_tokens
+from app.llm_backends import LLMBackend, create_backend
+from app.resilience import CircuitBreaker, CircuitOpenError, backoff_delay
+from app.response_cache import ResponseCache
+from app.singleflight import SingleFlight
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, NamedTuple, Optional
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+class GeminiServiceError(Exception):
+    """Raised when Gemini fails to produce a response"""
+
+class GeminiUnavailableError(GeminiServiceError):
+    """Raised when a request is refused without reaching Gemini; retry after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class GeminiOverloadedError(GeminiUnavailableError):
+    """Raised when a request is shed by admission control"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Gemini admission queue is saturated", retry_after)
+
+class GeminiCircuitOpenError(GeminiUnavailableError):
+    """Raised while the circuit breaker considers Gemini unhealthy"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Gemini is unavailable, failing fast", retry_after)
+
+class GeminiTimeoutError(GeminiServiceError):
+    """Raised when a request runs out of its deadline"""
+
+class ChatReply(NamedTuple):
+    text: str
+    # Estimated tokens sent upstream for this reply; 0 when it came from the cache or another request
+    prompt_tokens: int
+
 class GeminiService:
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+    """Chat generation on top of an LLM backend (Gemini unless LLM_BACKEND says otherwise)"""
+
+    def __init__(self, backend: Optional[LLMBackend] = None):
+        self.backend = backend or create_backend(settings)
+        self.model_name = self.backend.model_name
+        # Backend-specific upstream errors plus timeouts and dropped connections are retried
+        self.transient_errors = self.backend.transient_errors + (asyncio.TimeoutError, ConnectionError)
+        
+        # Optional cache of responses keyed by model, normalized prompt and context
+        self.cache = None
+        if settings.GEMINI_CACHE_ENABLED:
+            self.cache = ResponseCache(
+                max_entries=settings.GEMINI_CACHE_MAX_ENTRIES,
+                max_bytes=settings.GEMINI_CACHE_MAX_BYTES,
+                ttl_seconds=settings.GEMINI_CACHE_TTL_SECONDS
+            )
+        
+        # Identical concurrent requests share one upstream generation
+        self.inflight = SingleFlight() if settings.GEMINI_COALESCE_ENABLED else None
+        
+        # Live chat objects of active sessions, reused across turns
+        self.chat_pool = None
+        if settings.GEMINI_CHAT_POOL_SIZE > 0:
+            self.chat_pool = ChatPool(
+                max_size=settings.GEMINI_CHAT_POOL_SIZE,
+                idle_seconds=settings.GEMINI_CHAT_POOL_IDLE_SECONDS
+            )
+        
+        # Global cap on concurrent generations, admitting queued requests by priority
+        self.admission = AdmissionController(
+            concurrency=settings.GEMINI_MAX_CONCURRENCY,
+            max_queue_wait=settings.GEMINI_MAX_QUEUE_WAIT_SECONDS,
+            max_queue_length=settings.GEMINI_MAX_QUEUE_LENGTH
+        )
+        
+        # The SDK calls are blocking, so they run on a dedicated pool. A call abandoned at its
+        # deadline keeps its thread until the SDK returns, hence the headroom over the cap.
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.GEMINI_MAX_CONCURRENCY * 2,
+            thread_name_prefix="gemini"
+        )
+        
+        # Deadlines, retries and failing fast while Gemini is unhealthy
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.GEMINI_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.GEMINI_BREAKER_RESET_SECONDS
+        )
+        self.default_timeout = settings.GEMINI_DEFAULT_TIMEOUT_SECONDS
+        self.attempt_timeout = settings.GEMINI_ATTEMPT_TIMEOUT_SECONDS
+        self.stream_idle_timeout = settings.GEMINI_STREAM_IDLE_TIMEOUT_SECONDS
+        self.max_retries = settings.GEMINI_MAX_RETRIES
+        self.retry_base_delay = settings.GEMINI_RETRY_BASE_DELAY_SECONDS
+        self.retry_max_delay = settings.GEMINI_RETRY_MAX_DELAY_SECONDS
+        
+    def _deadline(self, deadline: Optional[float]) -> float:
+        """The caller's deadline (time.monotonic() based), or the default one for calls without a budget"""
+        return deadline if deadline is not None else time.monotonic() + self.default_timeout
+
+    @asynccontextmanager
+    async def _slot(self, priority: Priority, deadline: float):
+        """Hold one upstream concurrency slot for the duration of a generation"""
+        if self.breaker.is_open():
+            # Don't queue for an upstream that is known to be down
+            raise GeminiCircuitOpenError(self.breaker.retry_after())
+        
+        try:
+            await self.admission.acquire(priority, timeout=deadline - time.monotonic())
+        except AdmissionRejected as e:
+            if deadline <= time.monotonic():
+                raise GeminiTimeoutError("Deadline exceeded while waiting for admission") from e
+            logger.warning(f"Shedding {priority.name.lower()} Gemini request: {e}")
+            raise GeminiOverloadedError(e.retry_after) from e
+        try:
+            yield
+        finally:
+            self.admission.release()
+
+    async def _call(self, request, deadline: float):
+        """Run a blocking SDK request within the deadline, retrying transient failures with jittered backoff"""
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GeminiTimeoutError("Deadline exceeded")
+            
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError as e:
+                raise GeminiCircuitOpenError(e.retry_after) from e
+            
+            # Each attempt is bounded by the upstream's own time limit, and by what is left of
+            # the caller's deadline, which clients choose and queueing eats into
+            attempt_timeout = min(remaining, self.attempt_timeout)
+            try:
+                response = await asyncio.wait_for(self._run(request), timeout=attempt_timeout)
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+            except self.transient_errors as e:
+                if isinstance(e, asyncio.TimeoutError) and attempt_timeout < self.attempt_timeout:
+                    # The caller ran out of time, which says nothing about the upstream's health
+                    self.breaker.release_probe()
+                    raise GeminiTimeoutError("Deadline exceeded") from e
+                self.breaker.record_failure()
+                attempt += 1
+                delay = backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+                if attempt > self.max_retries or deadline - time.monotonic() <= delay:
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise GeminiTimeoutError("Deadline exceeded") from e
+                    raise
+                logger.warning(f"Gemini call failed ({e!r}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                # A non-transient error still shows the upstream is answering
+                self.breaker.record_success()
+                raise
+            
+            self.breaker.record_success()
+            return response
+
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking backend call on the Gemini executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def get_stats(self) -> dict:
+        """Admission, cache and chat reuse metrics"""
+        return {
+            "backend": self.backend.name,
+            "admission": self.admission.get_stats(),
+            "circuit_breaker": self.breaker.get_stats(),
+            "cache": self.cache.get_stats() if self.cache else None,
+            "coalescing": self.inflight.get_stats() if self.inflight else None,
+            "chat_pool": self.chat_pool.get_stats() if self.chat_pool else None
+        }
+
+    def _request_key(self, prompt: str, chat_history: list = None, use_cache: bool = True) -> Optional[str]:
+        """Key identifying interchangeable requests, or None when the request must run on its own"""
+        if not use_cache or (self.cache is None and self.inflight is None):
+            return None
+        return ResponseCache.make_key(self.model_name, prompt, chat_history)
+
+    async def _deduplicated(self, key: Optional[str], generate) -> str:
+        """Answer from the cache or an identical in-flight request before generating anew"""
+        if key is None:
+            return await generate()
         
-    async def chat(self, message: str, chat_history: list = None) -> str:
-        """Send a message to Gemini and get response"""
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        async def generate_and_store():
+            result = await generate()
+            if self.cache:
+                self.cache.set(key, result)
+            return result
+        
+        if self.inflight:
+            return await self.inflight.do(key, generate_and_store)
+        return await generate_and_store()
+
+    def _open_chat(
+        self,
+        message: str,
+        chat_history: list,
+        session_id: Optional[str],
+        revision: Optional[int],
+        summary_upto: int
+    ):
+        """Get a chat for this turn: the session's live chat if it is in sync, else one built from history.
+
+        chat_history is the context selected for this turn. Returns the chat and its estimated
+        history tokens, or (None, 0) for a one-off prompt.
+        """
+        chat_history = chat_history or []
+        if self.chat_pool is not None and session_id is not None:
+            # A reused chat keeps growing, so it is only reused while it holds exactly the
+            # selected context, and rebuilt from the selection otherwise
+            live = self.chat_pool.checkout(session_id, revision, summary_upto, len(chat_history))
+            if live is not None:
+                return live.chat, live.tokens
+        elif not chat_history:
+            return None, 0
+        
+        chat = self.backend.start_chat(chat_history)
+        return chat, sum(message_tokens(msg) for msg in chat_history)
+
+    def _keep_chat(
+        self,
+        session_id: Optional[str],
+        revision: Optional[int],
+        summary_upto: int,
+        chat,
+        chat_history: list,
+        tokens: int,
+        message: str,
+        reply: str
+    ):
+        """Pool a chat after a completed turn, which appended the user message and the reply"""
+        if self.chat_pool is None or session_id is None or chat is None:
+            return
+        self.chat_pool.checkin(
+            session_id,
+            chat,
+            revision=revision + 2,
+            summary_upto=summary_upto,
+            messages=len(chat_history or []) + 2,
+            tokens=tokens + estimate_tokens(message) + estimate_tokens(reply)
+        )
+
+    def forget_session(self, session_id: str):
+        """Drop any live chat held for a session"""
+        if self.chat_pool is not None:
+            self.chat_pool.discard(session_id)
+
+    async def chat(
+        self,
+        message: str,
+        chat_history: list = None,
+        use_cache: bool = True,
+        session_id: Optional[str] = None,
+        revision: Optional[int] = None,
+        summary_upto: int = 0,
+        priority: Priority = Priority.INTERACTIVE,
+        deadline: Optional[float] = None
+    ) -> ChatReply:
+        """Send a message to Gemini and get response.
+
+        When session_id, revision (the session's stored message count) and summary_upto are
+        given, the session's live chat is reused instead of being rebuilt from chat_history,
+        as long as it holds the same context. deadline is a time.monotonic() timestamp
+        covering queueing, retries and generation.
+        """
+        key = self._request_key(message, chat_history, use_cache)
+        usage = {}
+        text = await self._deduplicated(
+            key,
+            partial(
+                self._generate_reply, message, chat_history, session_id, revision, summary_upto, priority, deadline, usage
+            )
+        )
+        return ChatReply(text, usage.get("prompt_tokens", 0))
+
+    async def _generate_reply(
+        self,
+        message: str,
+        chat_history: list = None,
+        session_id: Optional[str] = None,
+        revision: Optional[int] = None,
+        summary_upto: int = 0,
+        priority: Priority = Priority.INTERACTIVE,
+        deadline: Optional[float] = None,
+        usage: Optional[dict] = None
+    ) -> str:
+        deadline = self._deadline(deadline)
         try:
-            # Prepare the conversation history
-            if chat_history:
-                # Convert chat history to the format expected by Gemini
-                history = []
-                for msg in chat_history[-10:]:  # Keep last 10 messages for context
-                    role = "user" if msg["role"] == "user" else "model"
-                    history.append({
-                        "role": role,
-                        "parts": [msg["content"]]
-                    })
-                
-                # Start a chat with history
-                chat = self.model.start_chat(history=history)
-                response = chat.send_message(message)
+            chat, tokens = self._open_chat(message, chat_history, session_id, revision, summary_upto)
+            if chat is not None:
+                request = partial(chat.send, message)
             else:
                 # Single message without history
-                response = self.model.generate_content(message)
+                request = partial(self.backend.generate, message)
+            
+            async with self._slot(priority, deadline):
+                reply = await self._call(request, deadline)
             
-            return response.text
+            if usage is not None:
+                usage["prompt_tokens"] = tokens + estimate_tokens(message)
+            self._keep_chat(session_id, revision, summary_upto, chat, chat_history, tokens, message, reply)
+            return reply
             
+        except GeminiServiceError:
+            raise
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return "I apologize, but I'm having trouble processing your request right now. Please try again later."
+            raise GeminiServiceError(str(e)) from e
+
+    async def chat_stream(
+        self,
+        message: str,
+        chat_history: list = None,
+        use_cache: bool = True,
+        session_id: Optional[str] = None,
+        revision: Optional[int] = None,
+        summary_upto: int = 0,
+        priority: Priority = Priority.INTERACTIVE,
+        deadline: Optional[float] = None,
+        usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        """Send a message to Gemini and yield the response text as it is generated.
+
+        The deadline covers the wait for the first chunk; after that each chunk has
+        stream_idle_timeout seconds to arrive. A given usage dict gets the prompt_tokens
+        actually sent (0 for a cached reply).
+        """
+        if usage is not None:
+            usage["prompt_tokens"] = 0
+        deadline = self._deadline(deadline)
+        cache_key = self._request_key(message, chat_history, use_cache) if self.cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        chat, tokens = self._open_chat(message, chat_history, session_id, revision, summary_upto)
+        if chat is None:
+            # Single message without history; a fresh chat streams the same as a one-off prompt
+            chat = self.backend.start_chat([])
+        request = partial(chat.send_stream, message)
+
+        # A stream holds its slot until the last chunk; the backend iterator blocks, so each
+        # chunk is pulled on the executor
+        parts = []
+        async with self._slot(priority, deadline):
+            try:
+                chunks = await self._call(request, deadline)
+            except GeminiServiceError:
+                raise
+            except Exception as e:
+                logger.error(f"Error starting response stream: {e}")
+                raise GeminiServiceError(str(e)) from e
+            if usage is not None:
+                usage["prompt_tokens"] = tokens + estimate_tokens(message)
+            
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(self._run(next, chunks, None), timeout=self.stream_idle_timeout)
+                except Exception as e:
+                    # Mid-stream failures can't be retried without replaying what was already sent
+                    if isinstance(e, self.transient_errors):
+                        self.breaker.record_failure()
+                    logger.error(f"Error while streaming response: {e!r}")
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise GeminiTimeoutError("Stream stalled") from e
+                    raise GeminiServiceError(str(e)) from e
+                if chunk is None:
+                    break
+                parts.append(chunk)
+                yield chunk
+        
+        # Only complete responses are cached, and only a fully consumed stream leaves the chat in sync
+        reply = "".join(parts)
+        if cache_key and parts:
+            self.cache.set(cache_key, reply)
+        self._keep_chat(session_id, revision, summary_upto, chat, chat_history, tokens, message, reply)
 
     async def generate_chat_title(self, first_message: str) -> str:
         """Generate a title for the chat session based on the first message"""
         try:
             prompt = f"Generate a short, descriptive title (max 6 words) for a conversation that starts with: '{first_message[:100]}...'"
-            response = self.model.generate_content(prompt)
-            title = response.text.strip().strip('"').strip("'")
-            return title[:50]  # Limit to 50 characters
+            return await self._deduplicated(self._request_key(prompt), partial(self._generate_title, prompt))
         except Exception as e:
             logger.error(f"Error generating chat title: {e}")
             return "New Chat"
 
+    async def _generate_title(self, prompt: str) -> str:
+        deadline = self._deadline(None)
+        async with self._slot(Priority.BACKGROUND, deadline):
+            title = await self._call(partial(self.backend.generate, prompt), deadline)
+        return title.strip().strip('"').strip("'")[:50]  # Limit to 50 characters
+
+    async def summarize(self, previous_summary: Optional[str], messages: list) -> str:
+        """Fold messages into a running summary of the conversation"""
+        transcript = "\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content'][:2000]}"
+            for msg in messages
+        )
+        prompt = (
+            "Update the summary of a conversation between a user and an AI assistant. "
+            "Keep facts, decisions, open questions and user preferences; drop small talk. "
+            "Answer with the summary only, in under 300 words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        deadline = self._deadline(None)
+        try:
+            async with self._slot(Priority.BACKGROUND, deadline):
+                summary = await self._call(partial(self.backend.generate, prompt), deadline)
+            return summary.strip()
+        except GeminiServiceError:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating summary: {e}")
+            raise GeminiServiceError(str(e)) from e
+
 # Create Gemini service instance
 gemini_service = GeminiService()
@@ -0,0 +1,146 @@
+from app.config import settings
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+from typing import Dict, Optional
+import asyncio
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+class IdempotencyKeyReused(Exception):
+    """Raised when a key comes back with a different request than it was first used for"""
+
+class IdempotencyInProgress(Exception):
+    """Raised when the first request with a key is still running after the wait for it"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("A request with this idempotency key is still in progress")
+        self.retry_after = retry_after
+
+def fingerprint(payload: str) -> str:
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class IdempotencyStore:
+    """Responses of requests sent with an Idempotency-Key, kept in the idempotency_keys collection.
+
+    The first request with a key claims it and runs; its successful response is stored for
+    ttl_seconds and replayed to later requests with the same key. A duplicate arriving while
+    the first is still running waits for its response. Keys of failed requests are released,
+    so a retry runs afresh. A claim is a lease: if the first request's worker dies, a
+    duplicate takes the key over once the lease expires.
+    """
+
+    def __init__(self):
+        self.ttl_seconds = settings.IDEMPOTENCY_TTL_SECONDS
+        self.lease_seconds = settings.CHAT_REQUEST_TIMEOUT_SECONDS + 30
+        self.max_wait = settings.IDEMPOTENCY_MAX_WAIT_SECONDS
+        self.poll_interval = 0.25
+        # Record id -> event set when a request on this worker finishes with the key
+        self._local: Dict[str, asyncio.Event] = {}
+
+        self.replayed = 0
+        self.waited = 0
+
+    @staticmethod
+    def _record_id(user_id: str, key: str) -> str:
+        return f"{user_id}:{key}"
+
+    async def begin(self, db, user_id: str, key: str, request_fingerprint: str) -> Optional[dict]:
+        """Claim a key for a request.
+
+        Returns None if the caller should run the request (and then call complete or
+        release), or the stored {"status_code", "body", "headers"} response to replay.
+        """
+        record_id = self._record_id(user_id, key)
+        give_up_at = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            now = datetime.utcnow()
+            try:
+                await db.idempotency_keys.insert_one({
+                    "_id": record_id,
+                    "fingerprint": request_fingerprint,
+                    "status": IN_PROGRESS,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds)
+                })
+                self._local[record_id] = asyncio.Event()
+                return None
+            except DuplicateKeyError:
+                record = await db.idempotency_keys.find_one({"_id": record_id})
+
+            if record is None:
+                # Released between the insert and the read; try to claim it again
+                continue
+            if record["fingerprint"] != request_fingerprint:
+                raise IdempotencyKeyReused("Idempotency key was already used for a different request")
+            if record["status"] == COMPLETED:
+                self.replayed += 1
+                return record["response"]
+
+            if record["lease_expires_at"] < now:
+                # The first request's worker is gone; take the key over
+                taken = await db.idempotency_keys.find_one_and_update(
+                    {"_id": record_id, "status": IN_PROGRESS, "lease_expires_at": record["lease_expires_at"]},
+                    {"$set": {"lease_expires_at": now + timedelta(seconds=self.lease_seconds)}}
+                )
+                if taken is not None:
+                    self._local[record_id] = asyncio.Event()
+                    return None
+                continue
+
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                raise IdempotencyInProgress(retry_after=1)
+            if not waited:
+                waited = True
+                self.waited += 1
+
+            # Woken at once if the first request runs on this worker, polled otherwise
+            event = self._local.get(record_id)
+            if event is None:
+                await asyncio.sleep(min(self.poll_interval, remaining))
+            else:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def complete(self, db, user_id: str, key: str, status_code: int, body, headers: Optional[dict] = None):
+        """Store a request's response for replay"""
+        record_id = self._record_id(user_id, key)
+        response = {"status_code": status_code, "body": body, "headers": headers or {}}
+        await db.idempotency_keys.update_one(
+            {"_id": record_id},
+            {
+                "$set": {"status": COMPLETED, "response": response},
+                "$unset": {"lease_expires_at": ""}
+            }
+        )
+        self._wake(record_id)
+
+    async def release(self, db, user_id: str, key: str):
+        """Drop the claim of a failed request so that a retry runs again"""
+        record_id = self._record_id(user_id, key)
+        await db.idempotency_keys.delete_one({"_id": record_id, "status": IN_PROGRESS})
+        self._wake(record_id)
+
+    def _wake(self, record_id: str):
+        event = self._local.pop(record_id, None)
+        if event is not None:
+            event.set()
+
+    def get_stats(self) -> dict:
+        return {
+            "in_progress_here": len(self._local),
+            "replayed": self.replayed,
+            "waited": self.waited
+        }
+
+# Create idempotency store instance
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,202 @@
+from typing import Iterator, List
+import hashlib
+import logging
+import math
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+class LLMChat:
+    """A multi-turn conversation held by a backend. Calls are blocking."""
+
+    def send(self, message: str) -> str:
+        raise NotImplementedError
+
+    def send_stream(self, message: str) -> Iterator[str]:
+        """Send a message and return an iterator over the reply's text chunks.
+
+        The request itself is made before returning, so that failures to start the reply
+        surface (and can be retried) here rather than on the first chunk.
+        """
+        raise NotImplementedError
+
+class LLMBackend:
+    """Blocking text-generation API driven by GeminiService from its executor.
+
+    History is a list of stored chat messages ({"role": "user" | "assistant", "content": ...}).
+    """
+
+    name = None
+    model_name = None
+    # Upstream errors worth retrying; anything else (bad request, safety block, ...) fails at once
+    transient_errors = ()
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def start_chat(self, history: List[dict]) -> LLMChat:
+        raise NotImplementedError
+
+class GeminiChat(LLMChat):
+    def __init__(self, chat):
+        self._chat = chat
+
+    def send(self, message: str) -> str:
+        return self._chat.send_message(message).text
+
+    def send_stream(self, message: str) -> Iterator[str]:
+        return GeminiBackend.texts(self._chat.send_message(message, stream=True))
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the google-generativeai SDK"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash"):
+        # Imported here so other backends run without the SDK installed
+        import google.generativeai as genai
+        from google.api_core import exceptions as google_exceptions
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.transient_errors = (
+            google_exceptions.TooManyRequests,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+            google_exceptions.GatewayTimeout,
+            google_exceptions.DeadlineExceeded
+        )
+
+    @staticmethod
+    def texts(response) -> Iterator[str]:
+        """Text of a streamed response's chunks"""
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata) carry nothing to forward
+                continue
+            if text:
+                yield text
+
+    def generate(self, prompt: str) -> str:
+        return self.model.generate_content(prompt).text
+
+    def start_chat(self, history: List[dict]) -> LLMChat:
+        """Start a chat, converting stored messages to the format expected by Gemini"""
+        gemini_history = [
+            {"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]}
+            for msg in history
+        ]
+        return GeminiChat(self.model.start_chat(history=gemini_history))
+
+class FakeBackendError(ConnectionError):
+    """Injected upstream failure; a ConnectionError, so it is retried like a real transient error"""
+
+class FakeChat(LLMChat):
+    def __init__(self, backend: "FakeBackend", history: List[dict]):
+        self._backend = backend
+        self.history = list(history)
+
+    def send(self, message: str) -> str:
+        reply = self._backend.reply(message, self.history)
+        self.history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+        return reply
+
+    def send_stream(self, message: str) -> Iterator[str]:
+        return self._backend.stream(message, self.history)
+
+class FakeBackend(LLMBackend):
+    """Offline stand-in for load testing: no network, no quota, reproducible timings.
+
+    Every random draw is seeded from the seed, the prompt and the history length, so the
+    same request always gets the same latency, reply and injected failures.
+    Time to first byte is log-normal with the given median and 99th percentile.
+    """
+
+    name = "fake"
+    model_name = "fake"
+    transient_errors = (FakeBackendError,)
+
+    def __init__(
+        self,
+        latency_median_ms: float = 800,
+        latency_p99_ms: float = 3000,
+        reply_chars: int = 600,
+        chunk_chars: int = 40,
+        chunk_interval_ms: float = 50,
+        error_rate: float = 0.0,
+        stream_error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.latency_median = latency_median_ms / 1000
+        # 2.326 is the z-score of the 99th percentile
+        self.latency_sigma = math.log(max(latency_p99_ms, latency_median_ms) / latency_median_ms) / 2.326
+        self.reply_chars = reply_chars
+        self.chunk_chars = max(1, chunk_chars)
+        self.chunk_interval = chunk_interval_ms / 1000
+        self.error_rate = error_rate
+        self.stream_error_rate = stream_error_rate
+        self.seed = seed
+
+    def _rng(self, prompt: str, history: List[dict]) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}|{len(history)}|{prompt}".encode()).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _respond(self, rng: random.Random, prompt: str) -> str:
+        """Wait out the time to first byte, maybe fail, and make up a reply"""
+        time.sleep(self.latency_median * math.exp(self.latency_sigma * rng.gauss(0, 1)))
+        if rng.random() < self.error_rate:
+            raise FakeBackendError("Injected upstream failure")
+
+        text = f"Fake reply to: {' '.join(prompt.split())[:80]} "
+        words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+        while len(text) < self.reply_chars:
+            text += rng.choice(words) + " "
+        return text[:self.reply_chars]
+
+    def reply(self, prompt: str, history: List[dict]) -> str:
+        return self._respond(self._rng(prompt, history), prompt)
+
+    def stream(self, prompt: str, history: List[dict]) -> Iterator[str]:
+        """Reply in chunk_chars pieces, chunk_interval apart, appending the turn to history once done"""
+        rng = self._rng(prompt, history)
+        text = self._respond(rng, prompt)
+
+        def chunks():
+            for start in range(0, len(text), self.chunk_chars):
+                if start:
+                    time.sleep(self.chunk_interval)
+                    if rng.random() < self.stream_error_rate:
+                        raise FakeBackendError("Injected failure mid-stream")
+                yield text[start:start + self.chunk_chars]
+            history.extend([{"role": "user", "content": prompt}, {"role": "assistant", "content": text}])
+
+        return chunks()
+
+    def generate(self, prompt: str) -> str:
+        return self.reply(prompt, [])
+
+    def start_chat(self, history: List[dict]) -> LLMChat:
+        return FakeChat(self, history)
+
+def create_backend(settings) -> LLMBackend:
+    """Build the backend selected by settings.LLM_BACKEND"""
+    if settings.LLM_BACKEND == "gemini":
+        return GeminiBackend(settings.GEMINI_API_KEY)
+    if settings.LLM_BACKEND == "fake":
+        logger.warning("Using the fake LLM backend; replies are generated locally")
+        return FakeBackend(
+            latency_median_ms=settings.FAKE_LLM_LATENCY_MEDIAN_MS,
+            latency_p99_ms=settings.FAKE_LLM_LATENCY_P99_MS,
+            reply_chars=settings.FAKE_LLM_REPLY_CHARS,
+            chunk_chars=settings.FAKE_LLM_CHUNK_CHARS,
+            chunk_interval_ms=settings.FAKE_LLM_CHUNK_INTERVAL_MS,
+            error_rate=settings.FAKE_LLM_ERROR_RATE,
+            stream_error_rate=settings.FAKE_LLM_STREAM_ERROR_RATE,
+            seed=settings.FAKE_LLM_SEED
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {settings.LLM_BACKEND!r}")
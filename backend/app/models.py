@@ -47,6 +47,7 @@ class UserInDB(UserBase):
     updated_at: datetime
     is_admin: bool = False
     google_id: Optional[str] = None
+    tier: Optional[str] = None  # Rate limit tier; defaults by role when unset
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -55,6 +56,15 @@ class UserInDB(UserBase):
     )
 
 # Authentication models
+class TokenUser(BaseModel):
+    """A user as described by the claims of a self-contained access token"""
+    id: str
+    email: EmailStr
+    is_active: bool = True
+    is_verified: bool = False
+    is_admin: bool = False
+    tier: Optional[str] = None
+
 class Token(BaseModel):
     access_token: str
     refresh_token: str
@@ -62,6 +72,21 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    exp: Optional[int] = None
+    type: Optional[str] = None
+    # Refresh token record and family
+    jti: Optional[str] = None
+    fam: Optional[str] = None
+    # Claims of self-contained access tokens (JWT_EMBED_CLAIMS)
+    uid: Optional[str] = None
+    active: Optional[bool] = None
+    verified: Optional[bool] = None
+    admin: Optional[bool] = None
+    tier: Optional[str] = None
+    ver: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -93,10 +118,31 @@ class ChatSession(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
+    use_cache: bool = True  # Set to False to always get a fresh generation
+    background: bool = False  # Set to True to get a job id at once and poll for the reply
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
+    prompt_tokens: Optional[int] = None  # Estimated tokens sent to the model for this turn; 0 if answered from the cache
+
+class ChatBatchItem(BaseModel):
+    message: str
+    session_id: Optional[str] = None  # Omit to start a new session
+    id: Optional[str] = None  # Echoed back on the item's result line
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatBatchItem] = Field(..., min_length=1)
+    max_parallel: Optional[int] = Field(None, ge=1)  # Capped by CHAT_BATCH_MAX_PARALLEL
+    use_cache: bool = True
+
+class ChatJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded or failed
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[ChatResponse] = None
+    error: Optional[dict] = None  # detail, status_code and retry_after of a failed job
 
 # Email verification models
 class EmailVerification(BaseModel):
@@ -0,0 +1,47 @@
+from collections import defaultdict
+from typing import Dict, Set
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Notifier:
+    """Push events to a user's open WebSocket connections on this worker.
+
+    Each connection registers the queue its sender drains. Pushes never block: an event
+    for a connection whose queue is full is dropped, as everything pushed can also be
+    fetched over HTTP.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.dropped = 0
+
+    def subscribe(self, user_id: str, queue: asyncio.Queue):
+        self._queues[user_id].add(queue)
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._queues.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._queues[user_id]
+
+    def publish(self, user_id: str, event: dict):
+        for queue in self._queues.get(user_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.warning(f"Dropped {event.get('type')} event for a slow connection of user {user_id}")
+
+    def get_stats(self) -> dict:
+        return {
+            "users": len(self._queues),
+            "connections": sum(len(queues) for queues in self._queues.values()),
+            "dropped": self.dropped
+        }
+
+# Create notifier instance
+notifier = Notifier()
@@ -0,0 +1,88 @@
+from app.auth import get_password_hash, verify_password
+from app.config import settings
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASHER_BUSY_MESSAGE = "Too many sign-in attempts right now. Please try again in a moment."
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+class PasswordHasher:
+    """bcrypt off the event loop, on a dedicated, bounded thread pool.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism without the
+    cost of a process pool. At most `workers` hashes run at once and `max_queue` more may
+    wait; beyond that requests are refused rather than piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # Submitted and not yet finished, counted until the thread is done even if the caller gave up
+        self._pending = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _finished(self, _):
+        self._pending -= 1
+
+    async def _submit(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+
+        def timed():
+            started = time.monotonic()
+            return fn(*args), started, time.monotonic()
+
+        loop = asyncio.get_running_loop()
+        submitted = time.monotonic()
+        self._pending += 1
+        future = self._executor.submit(timed)
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._finished, f))
+        result, started, finished = await asyncio.wrap_future(future)
+
+        wait = started - submitted
+        self.completed += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.total_run += finished - started
+        return result
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(get_password_hash, password)
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / self.completed * 1000, 1) if self.completed else None,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "avg_run_ms": round(self.total_run / self.completed * 1000, 1) if self.completed else None
+        }
+
+# Create password hasher instance
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
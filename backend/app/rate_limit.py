@@ -0,0 +1,188 @@
+from pymongo import ReturnDocument
+from app.config import settings
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+import json
+import logging
+import math
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIERS = {
+    "default": {"requests_per_minute": 20, "burst": 10, "max_concurrent": 2},
+    "admin": {"requests_per_minute": 120, "burst": 30, "max_concurrent": 8}
+}
+
+class TierLimits(NamedTuple):
+    requests_per_minute: float
+    burst: int
+    max_concurrent: int
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.requests_per_minute / 60
+
+class RateLimitExceeded(Exception):
+    """Raised when a user is over their request rate or concurrency limit"""
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+def load_tiers(raw: str) -> dict:
+    """Parse RATE_LIMIT_TIERS (a JSON object of tier name to limits)"""
+    tiers = dict(DEFAULT_TIERS)
+    if raw:
+        tiers.update(json.loads(raw))
+    return {name: TierLimits(**limits) for name, limits in tiers.items()}
+
+def _retry_after(tokens: float, limits: TierLimits) -> int:
+    """Seconds until a bucket holding `tokens` has a whole token again"""
+    return max(1, math.ceil((1 - tokens) / limits.refill_per_second))
+
+class InMemoryRateLimitBackend:
+    """Token buckets and concurrency counters held by this worker"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._leases = {}
+
+    async def take_token(self, db, user_id: str, limits: TierLimits) -> Optional[int]:
+        now = time.monotonic()
+        tokens, refilled_at = self._buckets.get(user_id, (limits.burst, now))
+        tokens = min(limits.burst, tokens + (now - refilled_at) * limits.refill_per_second)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            return _retry_after(tokens, limits)
+        self._buckets[user_id] = (tokens - 1, now)
+        return None
+
+    async def acquire_slot(self, db, user_id: str, lease_id: str, limits: TierLimits) -> bool:
+        leases = self._leases.setdefault(user_id, set())
+        if len(leases) >= limits.max_concurrent:
+            return False
+        leases.add(lease_id)
+        return True
+
+    async def release_slot(self, db, user_id: str, lease_id: str):
+        leases = self._leases.get(user_id)
+        if leases is not None:
+            leases.discard(lease_id)
+            if not leases:
+                del self._leases[user_id]
+
+class MongoRateLimitBackend:
+    """Token buckets and concurrency leases shared by all workers through the rate_limits collection.
+
+    Each check is a single atomic pipeline update, so concurrent workers cannot both spend
+    the last token or take the last slot. Leases expire on their own in case a worker dies
+    while holding one.
+    """
+
+    def __init__(self, lease_seconds: int):
+        self.lease_seconds = lease_seconds
+
+    async def take_token(self, db, user_id: str, limits: TierLimits) -> Optional[int]:
+        now = datetime.utcnow()
+        elapsed_seconds = {"$divide": [{"$subtract": [now, {"$ifNull": ["$refilled_at", now]}]}, 1000]}
+        doc = await db.rate_limits.find_one_and_update(
+            {"_id": f"bucket:{user_id}"},
+            [
+                {"$set": {
+                    "tokens": {"$min": [
+                        limits.burst,
+                        {"$add": [{"$ifNull": ["$tokens", limits.burst]}, {"$multiply": [elapsed_seconds, limits.refill_per_second]}]}
+                    ]},
+                    "refilled_at": now,
+                    "expires_at": now + timedelta(days=1)
+                }},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc["allowed"]:
+            return None
+        return _retry_after(doc["tokens"], limits)
+
+    async def acquire_slot(self, db, user_id: str, lease_id: str, limits: TierLimits) -> bool:
+        now = datetime.utcnow()
+        lease = {"id": lease_id, "expires_at": now + timedelta(seconds=self.lease_seconds)}
+        doc = await db.rate_limits.find_one_and_update(
+            {"_id": f"slots:{user_id}"},
+            [
+                # Drop leases left behind by crashed workers, then take a slot if one is free
+                {"$set": {"leases": {"$filter": {
+                    "input": {"$ifNull": ["$leases", []]},
+                    "cond": {"$gt": ["$$this.expires_at", now]}
+                }}}},
+                {"$set": {
+                    "leases": {"$cond": [
+                        {"$lt": [{"$size": "$leases"}, limits.max_concurrent]},
+                        {"$concatArrays": ["$leases", [lease]]},
+                        "$leases"
+                    ]},
+                    "expires_at": lease["expires_at"]
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return any(held["id"] == lease_id for held in doc["leases"])
+
+    async def release_slot(self, db, user_id: str, lease_id: str):
+        await db.rate_limits.update_one(
+            {"_id": f"slots:{user_id}"},
+            {"$pull": {"leases": {"id": lease_id}}}
+        )
+
+class RateLimiter:
+    """Per-user token-bucket rate limiting and concurrent request caps, by user tier"""
+
+    def __init__(self):
+        self.enabled = settings.RATE_LIMIT_ENABLED
+        self.tiers = load_tiers(settings.RATE_LIMIT_TIERS)
+        if settings.RATE_LIMIT_BACKEND == "mongo":
+            self.backend = MongoRateLimitBackend(settings.RATE_LIMIT_LEASE_SECONDS)
+        else:
+            self.backend = InMemoryRateLimitBackend()
+
+    def limits_for(self, user) -> TierLimits:
+        tier = getattr(user, "tier", None) or ("admin" if user.is_admin else "default")
+        return self.tiers.get(tier, self.tiers["default"])
+
+    async def acquire(self, db, user) -> Optional[str]:
+        """Admit a request for the user, returning a lease to release when it finishes"""
+        if not self.enabled:
+            return None
+        
+        limits = self.limits_for(user)
+        # Slot first: a request refused for concurrency must not spend a token of its quota
+        lease_id = secrets.token_hex(8)
+        if not await self.backend.acquire_slot(db, user.id, lease_id, limits):
+            raise RateLimitExceeded("Too many concurrent requests. Please wait for a reply to finish.", 1)
+        
+        try:
+            retry_after = await self.backend.take_token(db, user.id, limits)
+            if retry_after is not None:
+                raise RateLimitExceeded("Too many requests. Please slow down.", retry_after)
+        except BaseException:
+            await self.release(db, user, lease_id)
+            raise
+        return lease_id
+
+    async def release(self, db, user, lease_id: Optional[str]):
+        if lease_id is None:
+            return
+        try:
+            await self.backend.release_slot(db, user.id, lease_id)
+        except Exception as e:
+            # The lease expires on its own; don't fail a finished request over it
+            logger.warning(f"Failed to release rate limit slot for {user.id}: {e}")
+
+# Create rate limiter instance
+rate_limiter = RateLimiter()
@@ -0,0 +1,87 @@
+from app.auth import create_refresh_token
+from app.config import settings
+from app.models import TokenData
+from datetime import datetime, timedelta
+from typing import Optional
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+class RefreshTokenReused(Exception):
+    """Raised when a refresh token that was already exchanged is presented again"""
+
+class RefreshTokenStore:
+    """Rotating refresh tokens, tracked in the refresh_tokens collection.
+
+    Every refresh token names a record (jti) and the family it belongs to (fam); a family
+    starts at login. Exchanging a token marks its record used and issues its successor in
+    the same family. A used token coming back means it leaked, or its successor did, so
+    the whole family is revoked and its holder has to log in again. Records expire with
+    their tokens.
+    """
+
+    def __init__(self):
+        self.lifetime = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+        self.issued = 0
+        self.rotated = 0
+        self.reused = 0
+
+    async def issue(self, db, email: str, family: Optional[str] = None) -> str:
+        """Create a refresh token for a user, starting a new family unless one is given"""
+        jti = secrets.token_urlsafe(16)
+        family = family or secrets.token_urlsafe(16)
+        now = datetime.utcnow()
+        await db.refresh_tokens.insert_one({
+            "_id": jti,
+            "family": family,
+            "email": email,
+            "created_at": now,
+            "used_at": None,
+            "expires_at": now + self.lifetime
+        })
+        self.issued += 1
+        return create_refresh_token({"sub": email, "jti": jti, "fam": family})
+
+    async def rotate(self, db, token_data: TokenData) -> Optional[str]:
+        """Exchange a verified refresh token for its successor.
+
+        Returns None if the token is unknown or its family was revoked, and raises
+        RefreshTokenReused (after revoking the family) if it was exchanged before.
+        """
+        if token_data.jti is None:
+            return None
+
+        record = await db.refresh_tokens.find_one_and_update(
+            {"_id": token_data.jti, "used_at": None},
+            {"$set": {"used_at": datetime.utcnow()}}
+        )
+        if record is None:
+            if await db.refresh_tokens.find_one({"_id": token_data.jti}, {"_id": 1}) is None:
+                return None
+            await self.revoke_family(db, token_data.fam)
+            self.reused += 1
+            logger.warning(f"Refresh token reuse for {token_data.email}; revoked its family")
+            raise RefreshTokenReused("Refresh token was already used")
+
+        self.rotated += 1
+        return await self.issue(db, record["email"], record["family"])
+
+    async def revoke_family(self, db, family: Optional[str]):
+        if family is not None:
+            await db.refresh_tokens.delete_many({"family": family})
+
+    async def revoke_user(self, db, email: str):
+        """Revoke every refresh token of a user, e.g. after a password change"""
+        await db.refresh_tokens.delete_many({"email": email})
+
+    def get_stats(self) -> dict:
+        return {
+            "issued": self.issued,
+            "rotated": self.rotated,
+            "reused": self.reused
+        }
+
+# Create refresh token store instance
+refresh_token_store = RefreshTokenStore()
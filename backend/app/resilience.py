@@ -0,0 +1,97 @@
+import logging
+import math
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit breaker is open"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Circuit breaker is open")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Fail fast while an upstream is unhealthy.
+
+    Closed: calls go through, consecutive failures are counted.
+    Open: after failure_threshold consecutive failures, calls are refused for reset_timeout seconds.
+    Half-open: one probe call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        
+        self.times_opened = 0
+        self.rejected = 0
+
+    def is_open(self) -> bool:
+        """Whether calls are currently being refused outright"""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def retry_after(self) -> int:
+        """Seconds until an open circuit lets a probe through"""
+        if self.state != self.OPEN:
+            return 0
+        return max(1, math.ceil(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def before_call(self):
+        """Check whether a call may proceed, raising CircuitOpenError if not"""
+        if self.state == self.OPEN:
+            if self.is_open():
+                self.rejected += 1
+                raise CircuitOpenError(retry_after=self.retry_after())
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError(retry_after=1)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker opened after {self.consecutive_failures} consecutive failures")
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Give up a half-open probe that ended without a verdict (e.g. it was cancelled)"""
+        self._probe_in_flight = False
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+            "retry_after_seconds": self.retry_after() if self.is_open() else None,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff delay before retry number `attempt` (1-based)"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
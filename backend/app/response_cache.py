@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import List, Optional
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different spellings share a cache entry"""
+    return " ".join(prompt.split())
+
+def context_hash(chat_history: Optional[List[dict]]) -> str:
+    """Hash the role/content pairs of the history sent along with a prompt"""
+    pairs = [(msg["role"], msg["content"]) for msg in chat_history or []]
+    return hashlib.sha256(json.dumps(pairs).encode()).hexdigest()
+
+class ResponseCache:
+    """In-process LRU cache of model responses with a TTL and entry/byte limits"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (value, expires_at, size in bytes), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str, chat_history: Optional[List[dict]] = None) -> str:
+        """Cache key for a prompt sent to a model with the given history"""
+        raw = f"{model}\0{normalize_prompt(prompt)}\0{context_hash(chat_history)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        size = len(key) + len(value.encode())
+        if size > self.max_bytes:
+            return
+        
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+        self._bytes += size
+        
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
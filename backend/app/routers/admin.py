@@ -1,6 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.database import get_database
 from app.dependencies import get_current_admin_user, require_database
+from app.gemini_service import gemini_service
+from app.notifier import notifier
+from app.chat_jobs import chat_job_runner
+from app.idempotency import idempotency_store
+from app.user_cache import user_cache
+from app.token_revocation import revocation_list
+from app.token_cache import verified_token_cache
+from app.refresh_tokens import refresh_token_store
+from app.password_hasher import password_hasher
 from typing import List, Dict, Any
 from datetime import datetime
 import logging
@@ -58,6 +67,21 @@ async def get_admin_dashboard(
             detail="An error occurred while fetching dashboard data"
         )
 
+@router.get("/metrics")
+async def get_service_metrics(current_admin = Depends(get_current_admin_user)):
+    """Get in-process service metrics for this worker"""
+    return {
+        "gemini": gemini_service.get_stats(),
+        "websockets": notifier.get_stats(),
+        "chat_jobs": chat_job_runner.get_stats(),
+        "idempotency": idempotency_store.get_stats(),
+        "user_cache": user_cache.get_stats(),
+        "token_revocations": revocation_list.get_stats(),
+        "verified_tokens": verified_token_cache.get_stats(),
+        "refresh_tokens": refresh_token_store.get_stats(),
+        "password_hasher": password_hasher.get_stats()
+    }
+
 @router.get("/users")
 async def get_all_users(
     current_admin = Depends(get_current_admin_user),
@@ -132,6 +156,10 @@ async def toggle_user_active(
             {"_id": ObjectId(user_id)},
             {"$set": {"is_active": new_status, "updated_at": datetime.utcnow()}}
         )
+        await user_cache.invalidate(db, user["email"])
+        await revocation_list.revoke(db, user["email"])
+        if not new_status:
+            await refresh_token_store.revoke_user(db, user["email"])
         
         action = "activated" if new_status else "deactivated"
         return {"message": f"User {action} successfully"}
@@ -1,95 +1,230 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.models import ChatRequest, ChatResponse, ChatSession, ChatMessage
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from app.models import (
+    ChatBatchItem, ChatBatchRequest, ChatRequest, ChatResponse, ChatJobResponse, ChatSession, ChatMessage, UserInDB
+)
+from app.auth import verify_token
 from app.database import get_database
-from app.dependencies import get_current_verified_user, require_database
-from app.gemini_service import gemini_service
+from app.dependencies import (
+    authenticate_token, get_current_admin_user, get_current_verified_user, get_rate_limited_user,
+    get_request_deadline, rate_limited, require_database
+)
+from app.gemini_service import gemini_service, GeminiServiceError, GeminiTimeoutError, GeminiUnavailableError
+from app.admission import Priority
+from app.chat_store import chat_store, InvalidCursorError
+from app.context_builder import context_builder
+from app.summarizer import summarizer
+from app.chat_jobs import chat_job_runner, public_job, JobFailed
+from app.idempotency import idempotency_store, fingerprint, IdempotencyInProgress, IdempotencyKeyReused
+from app.notifier import notifier
+from app.rate_limit import rate_limiter, RateLimitExceeded
+from app.config import settings
+from app.tasks import spawn
 from bson import ObjectId
+from bson.errors import InvalidId
+from contextlib import aclosing
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Union
+import asyncio
+import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-@router.post("/", response_model=ChatResponse)
+DEFAULT_CHAT_TITLE = "New Chat"
+GEMINI_UNAVAILABLE_MESSAGE = "I apologize, but I'm having trouble processing your request right now. Please try again later."
+GEMINI_BUSY_MESSAGE = "The AI service is busy right now. Please try again in a moment."
+GEMINI_TIMEOUT_MESSAGE = "The AI service took too long to respond. Please try again."
+
+def _priority_for(user) -> Priority:
+    """Admission priority for a user's interactive requests"""
+    return Priority.ADMIN if user.is_admin else Priority.INTERACTIVE
+
+async def _prepare_session(request: ChatRequest, current_user, db) -> dict:
+    """Resolve the chat session for a request, with the message history to use as context"""
+    session_id = request.session_id
+    
+    # If no session_id provided, create a new session
+    if not session_id:
+        # Start with a placeholder title; the real one is generated alongside the reply
+        session = await chat_store.create_session(
+            db, current_user.id, DEFAULT_CHAT_TITLE, title_pending=True
+        )
+        session_id = str(session["_id"])
+        spawn(_generate_title(db, current_user.id, session_id, request.message), name=f"title-{session_id}")
+        return session
+    
+    # Ownership check and history load in a single read
+    session = await chat_store.load_session(
+        db, session_id, current_user.id, window=context_builder.max_messages
+    )
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat session not found"
+        )
+    
+    return session
+
+async def _generate_title(db, user_id: str, session_id: str, first_message: str):
+    """Generate a session title, patch it over the placeholder and push it to open connections"""
+    title = await gemini_service.generate_chat_title(first_message)
+    if await chat_store.set_title(db, session_id, title):
+        notifier.publish(user_id, {"type": "title", "session_id": session_id, "title": title})
+
+async def _save_failed_turn(db, session: dict, user_message: dict):
+    """Keep the user's message when generation fails, if configured to"""
+    if settings.CHAT_SAVE_USER_MESSAGE_ON_ERROR:
+        await chat_store.append_messages(db, session, [user_message])
+
+def _sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _complete_turn(request: ChatRequest, current_user, db, deadline: float) -> ChatResponse:
+    """Generate a reply to a chat message and persist the turn"""
+    session = await _prepare_session(request, current_user, db)
+    session_id = str(session["_id"])
+    user_message = chat_store.build_message("user", request.message)
+    context = context_builder.build_for_session(session, request.message)
+    
+    # Get response from Gemini
+    try:
+        reply = await gemini_service.chat(
+            request.message,
+            context.messages,
+            use_cache=request.use_cache,
+            session_id=session_id,
+            revision=session.get("message_count", 0),
+            summary_upto=session.get("summary_upto", 0),
+            priority=_priority_for(current_user),
+            deadline=deadline
+        )
+    except GeminiUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=GEMINI_BUSY_MESSAGE,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except GeminiTimeoutError:
+        await _save_failed_turn(db, session, user_message)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=GEMINI_TIMEOUT_MESSAGE
+        )
+    except GeminiServiceError:
+        await _save_failed_turn(db, session, user_message)
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=GEMINI_UNAVAILABLE_MESSAGE
+        )
+    
+    # Persist both sides of the turn in one write
+    assistant_message = chat_store.build_message("assistant", reply.text)
+    await chat_store.append_messages(db, session, [user_message, assistant_message])
+    summarizer.maybe_schedule(db, session, added=2)
+    
+    return ChatResponse(
+        response=reply.text,
+        session_id=session_id,
+        prompt_tokens=reply.prompt_tokens
+    )
+
+async def _submit_job(request: ChatRequest, current_user, db, response: Response) -> ChatJobResponse:
+    """Queue a chat message for a background worker, answering 202 with the job to poll"""
+    if await chat_job_runner.count_pending(db, current_user.id) >= settings.CHAT_JOB_MAX_PENDING_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many chat jobs in progress. Wait for one to finish.",
+            headers={"Retry-After": "5"}
+        )
+    
+    job = await chat_job_runner.submit(db, current_user.id, request.model_dump(exclude={"background"}))
+    response.status_code = status.HTTP_202_ACCEPTED
+    response.headers["Location"] = f"{router.prefix}/jobs/{job['_id']}"
+    return ChatJobResponse(**public_job(job))
+
+async def run_chat_job(job: dict, deadline: float) -> dict:
+    """Run a queued chat job for chat_job_runner"""
+    db = get_database()
+    user = await db.users.find_one({"_id": ObjectId(job["user_id"])})
+    if user is None or not user.get("is_active") or not user.get("is_verified"):
+        raise JobFailed("User is no longer allowed to chat", status_code=status.HTTP_403_FORBIDDEN)
+    user["_id"] = str(user["_id"])
+    
+    try:
+        result = await _complete_turn(ChatRequest(**job["payload"]), UserInDB(**user), db, deadline)
+    except HTTPException as e:
+        retry_after = (e.headers or {}).get("Retry-After")
+        raise JobFailed(e.detail, status_code=e.status_code, retry_after=int(retry_after) if retry_after else None)
+    return result.model_dump()
+
+async def _begin_idempotent(db, current_user, key: str, request: ChatRequest) -> Optional[dict]:
+    """Claim an idempotency key, returning the response to replay if the request already ran"""
+    try:
+        return await idempotency_store.begin(db, current_user.id, key, fingerprint(request.model_dump_json()))
+    except IdempotencyKeyReused as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except IdempotencyInProgress as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+@router.post("/", response_model=Union[ChatResponse, ChatJobResponse])
 async def chat(
     request: ChatRequest,
+    response: Response,
     current_user = Depends(get_current_verified_user),
-    db = Depends(require_database)
+    db = Depends(require_database),
+    deadline: float = Depends(get_request_deadline),
+    idempotency_key: Optional[str] = Header(None, max_length=255)
 ):
-    """Send a message to the chatbot"""
+    """Send a message to the chatbot. With "background": true, answer 202 with a job to poll instead.
+
+    Retries carrying the same Idempotency-Key get the first request's response rather than a
+    new generation; a retry sent while the first request is still running waits for it.
+    Replays and waits don't count against the rate limit, only requests that generate do.
+    """
     try:
-        session_id = request.session_id
-        
-        # If no session_id provided, create a new session
-        if not session_id:
-            # Generate title for new session
-            title = await gemini_service.generate_chat_title(request.message)
-            
-            session_doc = {
-                "user_id": current_user.id,
-                "title": title,
-                "messages": [],
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            
-            result = await db.chat_sessions.insert_one(session_doc)
-            session_id = str(result.inserted_id)
-        else:
-            # Verify session belongs to current user
-            session = await db.chat_sessions.find_one({
-                "_id": ObjectId(session_id),
-                "user_id": current_user.id
-            })
-            
-            if not session:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Chat session not found"
+        if idempotency_key is not None:
+            replay = await _begin_idempotent(db, current_user, idempotency_key, request)
+            if replay is not None:
+                return JSONResponse(
+                    status_code=replay["status_code"],
+                    content=replay["body"],
+                    headers={**replay["headers"], "Idempotent-Replayed": "true"}
                 )
         
-        # Get chat history for context
-        session = await db.chat_sessions.find_one({"_id": ObjectId(session_id)})
-        chat_history = session.get("messages", []) if session else []
-        
-        # Add user message to session
-        user_message = {
-            "role": "user",
-            "content": request.message,
-            "timestamp": datetime.utcnow()
-        }
-        
-        await db.chat_sessions.update_one(
-            {"_id": ObjectId(session_id)},
-            {
-                "$push": {"messages": user_message},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
-        
-        # Get response from Gemini
-        response_text = await gemini_service.chat(request.message, chat_history)
-        
-        # Add assistant message to session
-        assistant_message = {
-            "role": "assistant",
-            "content": response_text,
-            "timestamp": datetime.utcnow()
-        }
-        
-        await db.chat_sessions.update_one(
-            {"_id": ObjectId(session_id)},
-            {
-                "$push": {"messages": assistant_message},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
+        try:
+            async with rate_limited(db, current_user):
+                if request.background:
+                    result = await _submit_job(request, current_user, db, response)
+                else:
+                    result = await _complete_turn(request, current_user, db, deadline)
+        except BaseException:
+            # Only successes are kept; a retry of a failed request runs again
+            if idempotency_key is not None:
+                spawn(idempotency_store.release(db, current_user.id, idempotency_key), name="release-idempotency-key")
+            raise
         
-        return ChatResponse(
-            response=response_text,
-            session_id=session_id
-        )
+        if idempotency_key is not None:
+            headers = {"Location": response.headers["location"]} if "location" in response.headers else {}
+            await idempotency_store.complete(
+                db, current_user.id, idempotency_key,
+                status_code=response.status_code or status.HTTP_200_OK,
+                body=jsonable_encoder(result),
+                headers=headers
+            )
+        return result
         
     except HTTPException:
         raise
@@ -100,16 +235,421 @@ async def chat(
             detail="An error occurred while processing your message"
         )
 
+async def _reply_events(
+    db,
+    session: dict,
+    message: str,
+    use_cache: bool = True,
+    priority: Priority = Priority.INTERACTIVE,
+    deadline: Optional[float] = None
+):
+    """Generate a reply as (event, data) pairs and persist the turn once the stream ends"""
+    session_id = str(session["_id"])
+    user_message = chat_store.build_message("user", message)
+    context = context_builder.build_for_session(session, message)
+    parts = []
+    usage = {}
+    completed = False
+    try:
+        yield "session", {"session_id": session_id}
+        # Closing these events closes the upstream stream at once, releasing its admission slot
+        async with aclosing(gemini_service.chat_stream(
+            message,
+            context.messages,
+            use_cache=use_cache,
+            session_id=session_id,
+            revision=session.get("message_count", 0),
+            summary_upto=session.get("summary_upto", 0),
+            priority=priority,
+            deadline=deadline,
+            usage=usage
+        )) as chunks:
+            async for text in chunks:
+                parts.append(text)
+                yield "delta", {"text": text}
+        completed = True
+        yield "done", {"session_id": session_id, "prompt_tokens": usage["prompt_tokens"]}
+    except GeminiUnavailableError as e:
+        yield "error", {"detail": GEMINI_BUSY_MESSAGE, "retry_after": e.retry_after}
+    except GeminiTimeoutError:
+        yield "error", {"detail": GEMINI_TIMEOUT_MESSAGE}
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}")
+        yield "error", {"detail": GEMINI_UNAVAILABLE_MESSAGE}
+    finally:
+        # Runs on normal completion, upstream errors and client disconnects alike. The save is
+        # spawned rather than awaited because a disconnected stream is being cancelled.
+        if parts:
+            extra = {} if completed else {"interrupted": True}
+            assistant_message = chat_store.build_message("assistant", "".join(parts), **extra)
+            save = chat_store.append_messages(db, session, [user_message, assistant_message])
+            summarizer.maybe_schedule(db, session, added=2)
+        else:
+            save = _save_failed_turn(db, session, user_message)
+        spawn(save, name=f"save-turn-{session_id}")
+
+async def _stream_reply(db, session: dict, message: str, **options):
+    """Forward reply events as Server-Sent Events"""
+    events = _reply_events(db, session, message, **options)
+    try:
+        async for event, data in events:
+            yield _sse(event, data)
+    finally:
+        # A client disconnect closes this generator; close the inner one now so the turn is saved
+        await events.aclose()
+
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    current_user = Depends(get_rate_limited_user),
+    db = Depends(require_database),
+    deadline: float = Depends(get_request_deadline)
+):
+    """Send a message to the chatbot and stream the reply as Server-Sent Events"""
+    try:
+        session = await _prepare_session(request, current_user, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chat stream error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while processing your message"
+        )
+    
+    return StreamingResponse(
+        _stream_reply(
+            db, session, request.message,
+            use_cache=request.use_cache,
+            priority=_priority_for(current_user),
+            deadline=deadline
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _batch_turn(db, user, item: ChatBatchItem, use_cache: bool):
+    """Answer one batch item. Returns its result fields and the (session, messages, is_new) turn to save"""
+    if item.session_id:
+        try:
+            session = await chat_store.load_session(db, item.session_id, user.id, window=context_builder.max_messages)
+        except InvalidId:
+            session = None
+        if session is None:
+            return {"error": {"detail": "Chat session not found", "status_code": status.HTTP_404_NOT_FOUND}}, None
+        is_new = False
+    else:
+        # Saved with the reply; titled after the prompt, as a generated title per item would double the spend
+        session = chat_store.new_session(user.id, " ".join(item.message.split())[:50] or DEFAULT_CHAT_TITLE)
+        is_new = True
+    
+    context = context_builder.build_for_session(session, item.message)
+    try:
+        # No session_id: batch items shouldn't push interactive sessions' live chats out of the pool
+        reply = await gemini_service.chat(
+            item.message,
+            context.messages,
+            use_cache=use_cache,
+            priority=Priority.BACKGROUND,
+            deadline=time.monotonic() + settings.CHAT_REQUEST_TIMEOUT_SECONDS
+        )
+    except GeminiUnavailableError as e:
+        error = {"detail": GEMINI_BUSY_MESSAGE, "status_code": status.HTTP_503_SERVICE_UNAVAILABLE, "retry_after": e.retry_after}
+        return {"error": error}, None
+    except GeminiTimeoutError:
+        return {"error": {"detail": GEMINI_TIMEOUT_MESSAGE, "status_code": status.HTTP_504_GATEWAY_TIMEOUT}}, None
+    except GeminiServiceError:
+        return {"error": {"detail": GEMINI_UNAVAILABLE_MESSAGE, "status_code": status.HTTP_502_BAD_GATEWAY}}, None
+    
+    messages = [chat_store.build_message("user", item.message), chat_store.build_message("assistant", reply.text)]
+    result = {"session_id": str(session["_id"]), "response": reply.text, "prompt_tokens": reply.prompt_tokens}
+    return result, (session, messages, is_new)
+
+async def _save_batch_turns(db, turns: list):
+    await chat_store.save_turns(db, turns)
+    for session, messages, is_new in turns:
+        if not is_new:
+            summarizer.maybe_schedule(db, session, added=len(messages))
+
+async def _batch_results(db, user, batch: ChatBatchRequest):
+    """Run batch items with bounded parallelism, yielding an NDJSON line as each finishes.
+
+    Completed turns are saved CHAT_BATCH_WRITE_SIZE at a time with bulk writes. A final
+    line counts the items that succeeded and failed.
+    """
+    parallelism = min(batch.max_parallel or settings.CHAT_BATCH_MAX_PARALLEL, settings.CHAT_BATCH_MAX_PARALLEL)
+    semaphore = asyncio.Semaphore(parallelism)
+    
+    async def run(index: int, item: ChatBatchItem):
+        async with semaphore:
+            try:
+                fields, turn = await _batch_turn(db, user, item, batch.use_cache)
+            except Exception as e:
+                logger.error(f"Batch chat error: {e}")
+                fields, turn = {"error": {"detail": "An error occurred while processing your message", "status_code": 500}}, None
+        return {"index": index, "id": item.id, **fields}, turn
+    
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(batch.items)]
+    unsaved = []
+    succeeded = failed = 0
+    try:
+        for finished in asyncio.as_completed(tasks):
+            line, turn = await finished
+            if turn is None:
+                failed += 1
+            else:
+                succeeded += 1
+                unsaved.append(turn)
+            yield json.dumps(line) + "\n"
+            
+            if len(unsaved) >= settings.CHAT_BATCH_WRITE_SIZE:
+                turns, unsaved = unsaved, []
+                await _save_batch_turns(db, turns)
+        
+        turns, unsaved = unsaved, []
+        if turns:
+            await _save_batch_turns(db, turns)
+        yield json.dumps({"done": True, "succeeded": succeeded, "failed": failed}) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+        if unsaved:
+            # The client went away; keep the replies it was already sent
+            spawn(_save_batch_turns(db, unsaved), name="save-batch-turns")
+
+@router.post("/batch")
+async def chat_batch(
+    batch: ChatBatchRequest,
+    current_user = Depends(get_current_admin_user),
+    db = Depends(require_database)
+):
+    """Answer many independent prompts, streaming one NDJSON result line per item as it finishes"""
+    if len(batch.items) > settings.CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch holds at most {settings.CHAT_BATCH_MAX_ITEMS} items"
+        )
+    session_ids = [item.session_id for item in batch.items if item.session_id]
+    if len(session_ids) != len(set(session_ids)):
+        # Turns of one session would each be generated without the others' context
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A session may appear only once in a batch"
+        )
+    
+    return StreamingResponse(
+        _batch_results(db, current_user, batch),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _authenticate_websocket(websocket: WebSocket, db):
+    """Authenticate a connection by its Authorization header or, for browsers, its first frame.
+
+    Returns the user and the token's expiry (epoch seconds), or (None, None).
+    """
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer "):]
+    else:
+        try:
+            frame = json.loads(
+                await asyncio.wait_for(websocket.receive_text(), timeout=settings.WS_AUTH_TIMEOUT_SECONDS)
+            )
+        except (asyncio.TimeoutError, ValueError):
+            return None, None
+        token = frame.get("token") if isinstance(frame, dict) and frame.get("type") == "auth" else None
+    
+    if not isinstance(token, str):
+        return None, None
+    user = await authenticate_token(token, db, trust_claims=True)
+    if user is None:
+        return None, None
+    return user, verify_token(token).exp
+
+class _ChatConnection:
+    """One authenticated chat WebSocket.
+
+    Turns for any of the user's sessions run concurrently, up to WS_MAX_IN_FLIGHT. Every
+    outgoing frame goes through a bounded queue, so a slow reader stalls its own
+    generations rather than buffering them. The user is checked once, at connect; the
+    connection is closed when the token expires.
+    """
+
+    def __init__(self, websocket: WebSocket, db, user, expires_at: Optional[int]):
+        self.websocket = websocket
+        self.db = db
+        self.user = user
+        self.expires_at = expires_at
+        self.outbox = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.turns = set()
+        self.last_seen = time.monotonic()
+
+    async def run(self):
+        notifier.subscribe(self.user.id, self.outbox)
+        receiver = asyncio.create_task(self._receive_loop())
+        sender = asyncio.create_task(self._send_loop())
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            await asyncio.wait({receiver, sender, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            notifier.unsubscribe(self.user.id, self.outbox)
+            tasks = [receiver, sender, heartbeat, *self.turns]
+            for task in tasks:
+                task.cancel()
+            # Cancelled turns still save what was generated and release their rate limit lease
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        if heartbeat.done() and not heartbeat.cancelled() and heartbeat.exception() is None:
+            code, reason = heartbeat.result()
+            try:
+                await self.websocket.close(code=code, reason=reason)
+            except Exception:
+                pass
+
+    async def _receive_loop(self):
+        while True:
+            try:
+                text = await self.websocket.receive_text()
+            except WebSocketDisconnect:
+                return
+            self.last_seen = time.monotonic()
+            try:
+                frame = json.loads(text)
+            except ValueError:
+                frame = None
+            frame_type = frame.get("type") if isinstance(frame, dict) else None
+            
+            if frame_type == "chat":
+                self._start_turn(frame)
+            elif frame_type == "ping":
+                await self.outbox.put({"type": "pong"})
+            elif frame_type != "pong":
+                await self.outbox.put({"type": "error", "detail": "Unknown frame type"})
+
+    async def _send_loop(self):
+        while True:
+            frame = await self.outbox.get()
+            await self.websocket.send_text(json.dumps(frame))
+
+    async def _heartbeat_loop(self):
+        """Ping the client, and pick a close code once it goes quiet or its token expires"""
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_SECONDS)
+            if time.monotonic() - self.last_seen > settings.WS_IDLE_TIMEOUT_SECONDS:
+                return status.WS_1001_GOING_AWAY, "Idle timeout"
+            if self.expires_at is not None and time.time() >= self.expires_at:
+                return status.WS_1008_POLICY_VIOLATION, "Token expired"
+            try:
+                self.outbox.put_nowait({"type": "ping"})
+            except asyncio.QueueFull:
+                # Frames are already waiting to go out; the connection is evidently in use
+                pass
+
+    def _start_turn(self, frame: dict):
+        request_id = frame.get("id")
+        if len(self.turns) >= settings.WS_MAX_IN_FLIGHT:
+            self._reject(request_id, "Too many messages in flight on this connection")
+            return
+        try:
+            request = ChatRequest(**{
+                field: frame[field] for field in ("message", "session_id", "use_cache") if field in frame
+            })
+        except ValidationError:
+            self._reject(request_id, "Invalid chat message")
+            return
+        
+        task = asyncio.create_task(self._turn(request_id, request))
+        self.turns.add(task)
+        task.add_done_callback(self.turns.discard)
+
+    def _reject(self, request_id, detail: str):
+        # Rejections skip the queue so a backed-up connection can't block the receive loop
+        try:
+            self.outbox.put_nowait({"type": "error", "id": request_id, "detail": detail})
+        except asyncio.QueueFull:
+            pass
+
+    async def _turn(self, request_id, request: ChatRequest):
+        """Run one chat turn, forwarding its events tagged with the client's request id"""
+        deadline = time.monotonic() + settings.CHAT_REQUEST_TIMEOUT_SECONDS
+        try:
+            lease_id = await rate_limiter.acquire(self.db, self.user)
+        except RateLimitExceeded as e:
+            await self.outbox.put({"type": "error", "id": request_id, "detail": e.detail, "retry_after": e.retry_after})
+            return
+        
+        try:
+            session = await _prepare_session(request, self.user, self.db)
+            events = _reply_events(
+                self.db, session, request.message,
+                use_cache=request.use_cache,
+                priority=_priority_for(self.user),
+                deadline=deadline
+            )
+            try:
+                async for event, data in events:
+                    await self.outbox.put({"type": event, "id": request_id, **data})
+            finally:
+                await events.aclose()
+        except HTTPException as e:
+            await self.outbox.put({"type": "error", "id": request_id, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"WebSocket chat error: {e}")
+            await self.outbox.put({"type": "error", "id": request_id, "detail": GEMINI_UNAVAILABLE_MESSAGE})
+        finally:
+            await rate_limiter.release(self.db, self.user, lease_id)
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """Chat over one long-lived connection, authenticated once. See the README for the frame protocol"""
+    await websocket.accept()
+    db = get_database()
+    if db is None:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Database unavailable")
+        return
+    
+    try:
+        user, expires_at = await _authenticate_websocket(websocket, db)
+    except WebSocketDisconnect:
+        return
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+    if not user.is_active or not user.is_verified:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Inactive or unverified user")
+        return
+    
+    await websocket.send_text(json.dumps({"type": "ready"}))
+    await _ChatConnection(websocket, db, user, expires_at).run()
+
+@router.get("/jobs/{job_id}", response_model=ChatJobResponse)
+async def get_chat_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=settings.CHAT_JOB_MAX_WAIT_SECONDS),
+    current_user = Depends(get_current_verified_user),
+    db = Depends(require_database)
+):
+    """Get a background chat job, waiting up to `wait` seconds for it to finish"""
+    job = await chat_job_runner.wait(db, job_id, current_user.id, timeout=wait)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat job not found"
+        )
+    return ChatJobResponse(**public_job(job))
+
 @router.get("/sessions", response_model=List[dict])
 async def get_chat_sessions(
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user = Depends(get_current_verified_user),
     db = Depends(require_database)
 ):
-    """Get user's chat sessions"""
+    """Get user's chat sessions, newest first. The next page's cursor is returned in X-Next-Cursor"""
     try:
-        sessions = await db.chat_sessions.find(
-            {"user_id": current_user.id}
-        ).sort("updated_at", -1).to_list(length=100)
+        sessions, next_cursor = await chat_store.list_sessions(db, current_user.id, limit, cursor)
         
         # Convert ObjectId to string and format response
         result = []
@@ -119,11 +659,21 @@ async def get_chat_sessions(
                 "title": session["title"],
                 "created_at": session["created_at"],
                 "updated_at": session["updated_at"],
-                "message_count": len(session.get("messages", []))
+                "message_count": session.get("message_count", 0),
+                "last_message_preview": session.get("last_message_preview"),
+                "title_pending": session.get("title_pending", False)
             })
         
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        
         return result
         
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     except Exception as e:
         logger.error(f"Get sessions error: {e}")
         raise HTTPException(
@@ -139,10 +689,7 @@ async def get_chat_session(
 ):
     """Get a specific chat session with messages"""
     try:
-        session = await db.chat_sessions.find_one({
-            "_id": ObjectId(session_id),
-            "user_id": current_user.id
-        })
+        session = await chat_store.get_session(db, session_id, current_user.id)
         
         if not session:
             raise HTTPException(
@@ -153,7 +700,7 @@ async def get_chat_session(
         return {
             "id": str(session["_id"]),
             "title": session["title"],
-            "messages": session.get("messages", []),
+            "messages": [chat_store.public_message(message) for message in session.get("messages", [])],
             "created_at": session["created_at"],
             "updated_at": session["updated_at"]
         }
@@ -175,12 +722,10 @@ async def delete_chat_session(
 ):
     """Delete a chat session"""
     try:
-        result = await db.chat_sessions.delete_one({
-            "_id": ObjectId(session_id),
-            "user_id": current_user.id
-        })
+        deleted = await chat_store.delete_session(db, session_id, current_user.id)
+        gemini_service.forget_session(session_id)
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Chat session not found"
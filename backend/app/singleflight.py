@@ -0,0 +1,56 @@
+from typing import Any, Awaitable, Callable, Hashable
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers that ask for the same key"""
+
+    def __init__(self):
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the result of an identical call already in flight.
+
+        Every caller receives the same result or exception. The shared call is
+        cancelled only when all of its callers have gone away.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._forget(key, call))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        
+        call.waiters += 1
+        try:
+            # Shielded so one caller's cancellation does not cancel the call for the others
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every caller was cancelled first
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,60 @@
+from app.config import settings
+from app.chat_store import chat_store
+from app.gemini_service import gemini_service, GeminiServiceError
+from app.tasks import spawn
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ConversationSummarizer:
+    """Fold older turns of long sessions into a rolling summary, in the background"""
+
+    def __init__(self):
+        self.enabled = settings.CHAT_SUMMARY_ENABLED
+        # Summarize once this many messages sit outside the summary...
+        self.trigger_messages = settings.CHAT_SUMMARY_TRIGGER_MESSAGES
+        # ...folding in all but the most recent ones
+        self.keep_recent = settings.CHAT_SUMMARY_KEEP_RECENT
+        self._in_progress = set()
+
+    def maybe_schedule(self, db, session: dict, added: int = 0):
+        """Start a summarization job if the session has outgrown its summary"""
+        if not self.enabled:
+            return
+        
+        message_count = session.get("message_count", 0) + added
+        if message_count - session.get("summary_upto", 0) <= self.trigger_messages:
+            return
+        
+        session_id = session["_id"]
+        if session_id in self._in_progress:
+            return
+        self._in_progress.add(session_id)
+        spawn(self._summarize(db, session_id), name=f"summarize-{session_id}")
+
+    async def _summarize(self, db, session_id):
+        try:
+            session = await db.chat_sessions.find_one(
+                {"_id": session_id},
+                {"storage": 1, "summary": 1, "summary_upto": 1, "message_count": 1}
+            )
+            if not session:
+                return
+            
+            previous_upto = session.get("summary_upto", 0)
+            upto = session.get("message_count", 0) - self.keep_recent
+            if upto <= previous_upto:
+                return
+            
+            messages = await chat_store.load_range(db, session, previous_upto, upto)
+            summary = await gemini_service.summarize(session.get("summary"), messages)
+            
+            if await chat_store.set_summary(db, session_id, summary, previous_upto, upto):
+                logger.info(f"Summarized session {session_id} up to message {upto}")
+        except GeminiServiceError as e:
+            logger.warning(f"Summarization of session {session_id} failed: {e}")
+        finally:
+            self._in_progress.discard(session_id)
+
+# Create summarizer instance
+summarizer = ConversationSummarizer()
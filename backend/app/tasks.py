@@ -0,0 +1,19 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Keep strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+_background_tasks = set()
+
+def spawn(coro, name: str = None) -> asyncio.Task:
+    """Run a coroutine in the background, detached from the current request"""
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_task_done)
+    return task
+
+def _on_task_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
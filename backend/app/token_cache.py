@@ -0,0 +1,59 @@
+from app.config import settings
+from collections import OrderedDict
+import hashlib
+import time
+
+class VerifiedTokenCache:
+    """LRU of bearer tokens whose signature has already been checked, keyed by their digest.
+
+    An entry lives until the token's own exp, so caching never extends a token's life.
+    Only valid tokens are cached; a forged token is rejected by a full decode every time.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # digest -> (token data, exp), least recently used first
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        if self.max_entries <= 0:
+            return None
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, token: str, token_data, exp: int):
+        if self.max_entries <= 0 or exp <= time.time():
+            return
+        key = self._key(token)
+        self._entries[key] = (token_data, exp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None
+        }
+
+# Create verified token cache instance
+verified_token_cache = VerifiedTokenCache(max_entries=settings.JWT_VERIFIED_CACHE_MAX_ENTRIES)
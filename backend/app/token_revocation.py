@@ -0,0 +1,117 @@
+from app.config import settings
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from typing import Dict, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class RevocationList:
+    """Which users' self-contained access tokens can no longer be trusted.
+
+    Every user document carries a token_version, signed into access tokens as "ver".
+    Changing a user bumps it and records the new minimum in the token_revocations
+    collection, kept only as long as an access token lives. Each worker holds that
+    (small) collection as a user id -> minimum version map, refreshed every few
+    seconds. Tokens below their user's minimum fall back to a database lookup.
+    """
+
+    def __init__(self, enabled: bool, refresh_seconds: float, token_lifetime_seconds: float):
+        self.enabled = enabled
+        self.refresh_seconds = refresh_seconds
+        self.token_lifetime_seconds = token_lifetime_seconds
+        self._min_versions: Dict[str, int] = {}
+        self._refreshed_at = None
+        self._refresh_task = None
+
+        self.trusted = 0
+        self.distrusted = 0
+
+    def trusts(self, user_id: str, version: Optional[int]) -> bool:
+        """Whether a token's claims still describe the user"""
+        if not self.enabled:
+            return False
+        # Don't rely on a map that stopped refreshing
+        if self._refreshed_at is None or time.monotonic() - self._refreshed_at > self.refresh_seconds * 3:
+            self.distrusted += 1
+            return False
+        if version is None or version < self._min_versions.get(user_id, 0):
+            self.distrusted += 1
+            return False
+        self.trusted += 1
+        return True
+
+    async def revoke(self, db, email: str):
+        """Stop trusting the tokens issued to a user so far, after their document changed"""
+        if not self.enabled:
+            return
+        user = await db.users.find_one_and_update(
+            {"email": email},
+            {"$inc": {"token_version": 1}},
+            projection={"token_version": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if user is None:
+            return
+
+        user_id = str(user["_id"])
+        version = user["token_version"]
+        await db.token_revocations.update_one(
+            {"_id": user_id},
+            {
+                "$max": {"min_version": version},
+                "$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.token_lifetime_seconds)}
+            },
+            upsert=True
+        )
+        self._min_versions[user_id] = max(version, self._min_versions.get(user_id, 0))
+
+    async def refresh(self, db):
+        self._min_versions = {
+            doc["_id"]: doc["min_version"]
+            async for doc in db.token_revocations.find({}, {"min_version": 1})
+        }
+        self._refreshed_at = time.monotonic()
+
+    async def start(self, db):
+        if not self.enabled:
+            return
+        try:
+            await self.refresh(db)
+        except Exception as e:
+            logger.error(f"Error loading token revocations: {e}")
+        self._refresh_task = asyncio.create_task(self._refresh_loop(db), name="token-revocations")
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def _refresh_loop(self, db):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh(db)
+            except Exception as e:
+                logger.error(f"Error refreshing token revocations: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "revoked_users": len(self._min_versions),
+            "refreshed_seconds_ago": (
+                round(time.monotonic() - self._refreshed_at, 1) if self._refreshed_at is not None else None
+            ),
+            "trusted": self.trusted,
+            "distrusted": self.distrusted
+        }
+
+# Create revocation list instance
+revocation_list = RevocationList(
+    enabled=settings.JWT_EMBED_CLAIMS,
+    refresh_seconds=settings.JWT_REVOCATION_REFRESH_SECONDS,
+    token_lifetime_seconds=settings.JWT_CLAIMS_EXPIRE_MINUTES * 60
+)
@@ -0,0 +1,118 @@
+from app.config import settings
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class UserCache:
+    """In-process TTL LRU of users resolved by get_current_user, keyed by email.
+
+    Code that changes a user document calls invalidate(), which drops the entry here and
+    records the email in the user_invalidations collection; every worker polls that
+    collection and drops the entries it holds. The TTL bounds staleness if a signal is
+    missed.
+    """
+
+    def __init__(self, enabled: bool, max_entries: int, ttl_seconds: float, poll_seconds: float):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+        # email -> (user, expires_at), least recently used first
+        self._entries = OrderedDict()
+        # Bumped on every invalidation, so a read that raced one isn't cached
+        self.generation = 0
+        self._poll_task = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, email: str):
+        if not self.enabled:
+            return None
+        entry = self._entries.get(email)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[email]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(email)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, user, generation: int):
+        """Cache a user read from the database while the cache was at `generation`"""
+        if not self.enabled or generation != self.generation:
+            return
+        self._entries[user.email] = (user, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(user.email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def drop(self, email: str):
+        self.generation += 1
+        self._entries.pop(email, None)
+
+    async def invalidate(self, db, email: str):
+        """Drop a user on every worker after their document changed"""
+        if not self.enabled:
+            return
+        self.drop(email)
+        self.invalidations += 1
+        now = datetime.utcnow()
+        await db.user_invalidations.insert_one({
+            "email": email,
+            "at": now,
+            "expires_at": now + timedelta(seconds=max(self.ttl_seconds, self.poll_seconds) * 10)
+        })
+
+    def start(self, db):
+        if not self.enabled:
+            return
+        self._poll_task = asyncio.create_task(self._poll_loop(db), name="user-cache-invalidations")
+
+    async def stop(self):
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            await asyncio.gather(self._poll_task, return_exceptions=True)
+            self._poll_task = None
+
+    async def _poll_loop(self, db):
+        since = datetime.utcnow()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            # Overlap the polls a little: clocks of the workers writing signals drift, and
+            # dropping an entry twice is harmless
+            checked_at = datetime.utcnow()
+            try:
+                async for signal in db.user_invalidations.find(
+                    {"at": {"$gte": since - timedelta(seconds=5)}}, {"email": 1}
+                ):
+                    self.drop(signal["email"])
+                since = checked_at
+            except Exception as e:
+                logger.error(f"Error polling user invalidations: {e}")
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations
+        }
+
+# Create user cache instance
+user_cache = UserCache(
+    enabled=settings.USER_CACHE_ENABLED,
+    max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+    poll_seconds=settings.USER_CACHE_INVALIDATION_POLL_SECONDS
+)
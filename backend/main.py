@@ -1,12 +1,18 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
-from app.database import connect_to_mongo, close_mongo_connection
+from app.database import connect_to_mongo, close_mongo_connection, get_database
 from app.routers import chat, admin
 from app.clean_auth_router import router as clean_auth_router
 from app.config import settings
+from app.gemini_service import gemini_service
+from app.chat_jobs import chat_job_runner
+from app.user_cache import user_cache
+from app.token_revocation import revocation_list
+from app.password_hasher import PasswordHasherBusy, PASSWORD_HASHER_BUSY_MESSAGE
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,9 +23,17 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up StructMind API...")
     await connect_to_mongo()
+    db = get_database()
+    if db is not None:
+        chat_job_runner.start(db, chat.run_chat_job)
+        user_cache.start(db)
+        await revocation_list.start(db)
     yield
     # Shutdown
     logger.info("Shutting down StructMind API...")
+    await chat_job_runner.stop()
+    await user_cache.stop()
+    await revocation_list.stop()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -36,8 +50,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Location", "Idempotent-Replayed"],
 )
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    """Any endpoint hashing a password sheds load the same way when the hasher is saturated"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": PASSWORD_HASHER_BUSY_MESSAGE},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Include routers
 app.include_router(clean_auth_router)
 app.include_router(chat.router)
@@ -57,6 +81,11 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/health/upstream")
+async def upstream_health_check():
+    """Gemini circuit breaker state"""
+    return gemini_service.breaker.get_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,63 @@
+"""Move embedded chat messages into the bucketed chat_message_buckets collection.
+
+Usage:
+    python migrate_chat_messages.py [--batch-size 100] [--dry-run]
+
+The migration is resumable: each session's buckets are written with idempotent
+upserts before the session is switched to bucketed storage, and sessions that are
+already bucketed are skipped, so it can be interrupted and re-run at any time.
+Set CHAT_STORAGE_MODE=bucketed so new sessions are created bucketed as well.
+"""
+import argparse
+import asyncio
+import logging
+
+from app.chat_store import chat_store, BUCKETED_STORAGE
+from app.database import connect_to_mongo, close_mongo_connection, get_database
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+async def migrate(batch_size: int, dry_run: bool):
+    await connect_to_mongo()
+    db = get_database()
+    if db is None:
+        logger.error("Database not available, aborting migration")
+        return
+    
+    migrated = skipped = 0
+    last_id = None
+    try:
+        while True:
+            query = {"storage": {"$ne": BUCKETED_STORAGE}}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            
+            sessions = await db.chat_sessions.find(query, {"messages": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+            if not sessions:
+                break
+            
+            for session in sessions:
+                if dry_run:
+                    logger.info(f"Would migrate session {session['_id']} ({len(session.get('messages', []))} messages)")
+                    migrated += 1
+                elif await chat_store.migrate_session_to_buckets(db, session):
+                    migrated += 1
+                else:
+                    # Written to concurrently; the next run picks it up again
+                    skipped += 1
+                    logger.warning(f"Session {session['_id']} changed during migration, skipped")
+            
+            last_id = sessions[-1]["_id"]
+            logger.info(f"Progress: {migrated} migrated, {skipped} skipped (last id {last_id})")
+    finally:
+        await close_mongo_connection()
+    
+    logger.info(f"Done: {migrated} migrated, {skipped} skipped")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate embedded chat messages to bucketed storage")
+    parser.add_argument("--batch-size", type=int, default=100, help="Sessions fetched per batch")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be migrated without writing")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.dry_run))
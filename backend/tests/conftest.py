@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Settings are read at import, so configure them before any app module loads
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+import main
+from app.password_hasher import PasswordHasherBusy, PASSWORD_HASHER_BUSY_MESSAGE
+
+def test_busy_password_hasher_answers_503():
+    """A saturated hasher sheds sign-ins with 503 and Retry-After, not a generic 500"""
+    # Without the lifespan there is no database, so signup hashes through demo auth
+    client = TestClient(main.app)
+    busy = AsyncMock(side_effect=PasswordHasherBusy(retry_after=3))
+    with patch("app.demo_auth.password_hasher.hash", busy):
+        response = client.post(
+            "/auth/signup",
+            json={"email": "busy@example.com", "password": "secret123", "full_name": "Busy"}
+        )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+    assert response.json() == {"detail": PASSWORD_HASHER_BUSY_MESSAGE}
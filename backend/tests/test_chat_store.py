@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from app.chat_store import chat_store
+
+def test_save_turns_backfills_count_of_legacy_session():
+    """A session stored before the message counter gets N+2, not 2, from a batch write"""
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["test"]
+        old_messages = [chat_store.build_message("user" if i % 2 == 0 else "assistant", f"m{i}") for i in range(4)]
+        await db.chat_sessions.insert_one({"user_id": "u", "title": "Old", "messages": old_messages})
+        session = await db.chat_sessions.find_one({})
+        # As load_session returns it, with the counter computed from the array
+        session = {"_id": session["_id"], "message_count": len(old_messages)}
+        
+        turn = [chat_store.build_message("user", "hi"), chat_store.build_message("assistant", "hello")]
+        await chat_store.save_turns(db, [(session, turn, False)])
+        
+        stored = await db.chat_sessions.find_one({"_id": session["_id"]})
+        assert len(stored["messages"]) == 6
+        assert stored["message_count"] == 6
+    
+    asyncio.run(run())
@@ -0,0 +1,24 @@
+import asyncio
+
+from bson import ObjectId
+from unittest.mock import AsyncMock, patch
+
+from app.gemini_service import gemini_service
+from app.routers import chat
+
+def test_closing_reply_events_releases_admission_slot():
+    """Cancelling a turn mid-stream frees its upstream slot without waiting for the event loop"""
+    async def run():
+        session = {"_id": ObjectId(), "message_count": 0}
+        with patch.object(chat.chat_store, "append_messages", AsyncMock()), \
+                patch.object(chat.summarizer, "maybe_schedule"):
+            events = chat._reply_events(None, session, "hello", use_cache=False)
+            async for event, _ in events:
+                if event == "delta":
+                    break
+            assert gemini_service.admission.get_stats()["active"] == 1
+            
+            await events.aclose()
+            assert gemini_service.admission.get_stats()["active"] == 0
+    
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import asyncio
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.rate_limit import InMemoryRateLimitBackend, RateLimiter, RateLimitExceeded, TierLimits
+
+def make_limiter(limits: TierLimits) -> RateLimiter:
+    limiter = RateLimiter()
+    limiter.enabled = True
+    limiter.backend = InMemoryRateLimitBackend()
+    limiter.tiers = {"default": limits}
+    return limiter
+
+def test_concurrency_refusal_keeps_quota():
+    """A request turned away for concurrency doesn't spend a token"""
+    async def run():
+        limiter = make_limiter(TierLimits(requests_per_minute=1, burst=2, max_concurrent=1))
+        user = SimpleNamespace(id="u1", is_admin=False)
+
+        lease_id = await limiter.acquire(None, user)
+        for _ in range(3):
+            with pytest.raises(RateLimitExceeded, match="concurrent"):
+                await limiter.acquire(None, user)
+        await limiter.release(None, user, lease_id)
+
+        # The second token of the burst is still there
+        await limiter.release(None, user, await limiter.acquire(None, user))
+
+    asyncio.run(run())
+
+def test_rate_refusal_frees_slot():
+    """A request turned away for rate doesn't keep the slot it took"""
+    async def run():
+        limiter = make_limiter(TierLimits(requests_per_minute=1, burst=1, max_concurrent=1))
+        user = SimpleNamespace(id="u1", is_admin=False)
+
+        await limiter.release(None, user, await limiter.acquire(None, user))
+        with pytest.raises(RateLimitExceeded, match="slow down"):
+            await limiter.acquire(None, user)
+        assert limiter.backend._leases == {}
+
+    asyncio.run(run())
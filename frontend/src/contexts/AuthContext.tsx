@@ -89,16 +89,17 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
     };
 
     const refreshToken = async () => {
-        // TODO: Implement refresh token logic when backend supports it
         const refreshTokenValue = localStorage.getItem('refresh_token');
         if (!refreshTokenValue) {
             logout();
             return;
         }
 
-        // For now, just logout if token is expired
-        // In a real implementation, you would call a refresh endpoint
-        logout();
+        try {
+            await apiClient.refreshTokens();
+        } catch (error) {
+            logout();
+        }
     };
 
     const value: AuthContextType = {
@@ -6,6 +6,7 @@ const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
 class ApiClient {
     private client: AxiosInstance;
+    private refreshing: Promise<string> | null = null;
 
     constructor() {
         this.client = axios.create({
@@ -35,22 +36,20 @@ class ApiClient {
             async (error) => {
                 const originalRequest = error.config;
 
-                if (error.response?.status === 401 && !originalRequest._retry) {
+                if (error.response?.status === 401 && !originalRequest._retry && originalRequest.url !== '/auth/refresh') {
                     originalRequest._retry = true;
 
-                    try {
-                        const refreshToken = localStorage.getItem('refresh_token');
-                        if (refreshToken) {
-                            // TODO: Implement token refresh endpoint
-                            // For now, just logout
+                    const refreshToken = localStorage.getItem('refresh_token');
+                    if (refreshToken) {
+                        try {
+                            const accessToken = await this.refreshTokens();
+                            originalRequest.headers.Authorization = `Bearer ${accessToken}`;
+                            return this.client(originalRequest);
+                        } catch (refreshError) {
                             localStorage.removeItem('access_token');
                             localStorage.removeItem('refresh_token');
                             window.location.href = '/login';
                         }
-                    } catch (refreshError) {
-                        localStorage.removeItem('access_token');
-                        localStorage.removeItem('refresh_token');
-                        window.location.href = '/login';
                     }
                 }
 
@@ -65,6 +64,23 @@ class ApiClient {
         return response.data;
     }
 
+    // A refresh token works only once, so concurrent 401s share one exchange
+    async refreshTokens(): Promise<string> {
+        if (!this.refreshing) {
+            this.refreshing = this.client
+                .post<AuthResponse>('/auth/refresh', { refresh_token: localStorage.getItem('refresh_token') })
+                .then((response) => {
+                    localStorage.setItem('access_token', response.data.access_token);
+                    localStorage.setItem('refresh_token', response.data.refresh_token);
+                    return response.data.access_token;
+                })
+                .finally(() => {
+                    this.refreshing = null;
+                });
+        }
+        return this.refreshing;
+    }
+
     async signup(data: SignupRequest): Promise<{ message: string; success: boolean }> {
         const response = await this.client.post('/auth/signup', data);
         return response.data;